@@ -1,4 +1,22 @@
-import util
+import numpy as np
+
+# Daylight hours [DAY_START, DAY_END) used when no sunrise/sunset is given; the middle of the
+# ranges generateWeather in online.py draws from
+DAY_START = 6
+DAY_END = 19
+
+# Edges of the dispatch plans, in the order of the last axis of baselineBatch's flows
+EDGES = (('W', 'D'), ('W', 'B'), ('S', 'D'), ('S', 'B'), ('B', 'D'), ('P', 'D'), ('P', 'B'))
+EDGE_INDEX = dict((edge, i) for i, edge in enumerate(EDGES))
+
+def isDay(t, sunrise=DAY_START, sunset=DAY_END):
+  '''
+  Whether hour t (of the day, or counted from midnight of the first day) is in daylight. Works
+  on scalars or arrays; sunrise and sunset can be arrays too, e.g. from generateWeatherBatch.
+  '''
+  hour = np.mod(t, 24)
+  return (hour >= sunrise) & (hour < sunset)
+
 
 def baseline(d,t,w,s,b,p):
   if w + s > d:
@@ -9,8 +27,47 @@ def baseline(d,t,w,s,b,p):
     return ((t,[('W','D',w),('S','D',d-w),('S','B',w+s-d),('P','B',p)]),(t+1,[('W','D',w),('S','D',d-w),('S','B',w+s-d),('P','B',p)]),(t+2,[('W','D',w),('S','D',d-w),('S','B',w+s-d),('P','B',p)]))
   if w + s == d:
       return ((t,[('W','D',w),('S','D',s),('P','B',p)]),(t+1,[('W','D',w),('S','D',s),('P','B',p)]),(t+2,[('W','D',w),('S','D',s),('P','B',p)]))
-  if util.isDay(t):
+  if isDay(t):
     return ((t,[('W','D',w),('S','D',s),('P','D',d-s-w),('P','B',p+s+w-d)]),(t+1,[('W','D',w),('S','D',s),('P','D',d-s-w),('P','B',p+s+w-d)]),(t+2,[('W','D',w),('S','D',s),('P','D',d-s-w),('P','B',p+s+w-d)]))
   if w+b>=d:
     return ((t,[('W','D',w),('B','D',d-w),('P','B',p)]),(t+1,[('W','D',w),('B','D',d-w),('P','B',p)]),(t+2,[('W','D',w),('B','D',d-w),('P','B',p)]))
-  return ((t,[('W','D',w),('B','D',b),('P','D',d-b-w),('P','B',p+b+w-d)]),(t+1,[('W','D',w),('B','D',b),('P','D',d-b-w),('P','B',p+b+w-d)]),(t+2,[('W','D',w),('B','D',b),('P','D',d-b-w),('P','B',p+b+w-d)]))
\ No newline at end of file
+  return ((t,[('W','D',w),('B','D',b),('P','D',d-b-w),('P','B',p+b+w-d)]),(t+1,[('W','D',w),('B','D',b),('P','D',d-b-w),('P','B',p+b+w-d)]),(t+2,[('W','D',w),('B','D',b),('P','D',d-b-w),('P','B',p+b+w-d)]))
+
+def baselineBatch(d, t, w, s, b, p, steps=3, sunrise=DAY_START, sunset=DAY_END, dtype=float):
+  '''
+  Batch version of baseline: dispatches many intervals at once.
+
+  Parameters:
+  d, t, w, s, b, p - Arrays (or scalars) of demand, hour, wind, solar, battery charge and plant
+                     capacity, one entry per interval
+  steps            - Steps each plan covers; baseline repeats its plan for t, t + 1 and t + 2
+  sunrise, sunset  - Daylight hours for isDay
+
+  Return:
+  A (N x steps x len(EDGES)) array of flows, where flows[i, k, EDGE_INDEX[(source, sink)]] is the
+  amount baseline sends from source to sink at step t + k of interval i, and 0 for edges its plan
+  leaves out.
+  '''
+  d, t, w, s, b, p = np.broadcast_arrays(*[np.atleast_1d(x) for x in (d, t, w, s, b, p)])
+  # the cases of baseline, in order
+  surplus = w + s > d
+  windCovers = surplus & (w >= d)
+  solarCovers = surplus & (w < d)
+  exact = ~surplus & (w + s == d)
+  short = ~surplus & ~exact
+  day = short & isDay(t, sunrise, sunset)
+  night = short & ~day
+  batteryCovers = night & (w + b >= d)
+  plantCovers = night & ~(w + b >= d)
+
+  flows = np.zeros((len(d), len(EDGES)), dtype=dtype)
+  flows[:, EDGE_INDEX[('W', 'D')]] = np.where(windCovers, d, w)
+  flows[:, EDGE_INDEX[('W', 'B')]] = np.where(windCovers, w - d, 0)
+  flows[:, EDGE_INDEX[('S', 'D')]] = np.select([solarCovers, exact | day], [d - w, s], 0)
+  flows[:, EDGE_INDEX[('S', 'B')]] = np.select([windCovers, solarCovers], [s, w + s - d], 0)
+  flows[:, EDGE_INDEX[('B', 'D')]] = np.select([batteryCovers, plantCovers], [d - w, b], 0)
+  flows[:, EDGE_INDEX[('P', 'D')]] = np.select([day, plantCovers], [d - s - w, d - b - w], 0)
+  flows[:, EDGE_INDEX[('P', 'B')]] = np.select([day, plantCovers], [p + s + w - d, p + b + w - d], p)
+  out = np.empty((len(d), steps, len(EDGES)), dtype=dtype)
+  out[:] = flows[:, None, :]
+  return out
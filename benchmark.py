@@ -0,0 +1,221 @@
+# Benchmark suite for the day generators and the EMS strategies.
+#
+# Each case processes N days; the suite reports its throughput in days per second and its peak
+# traced memory for every N, so scaling can be read off directly, and can profile the largest run
+# of each case with cProfile. Results are written as JSON so runs from different versions can be
+# compared with --compare, and every per-day strategy is checked against its batch version on the
+# same run (see checkFloors). Nothing here needs matplotlib.
+
+import argparse
+import contextlib
+import cProfile
+import io
+import json
+import os
+import platform
+import pstats
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+import offline
+import online
+
+SIZES = [1000, 10000, 100000]
+PER_DAY_MAX = 1000   # per-day (scalar) cases are slow, so they stop at this size
+B_MAX = 180
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cli.py')
+
+def scalarDays(numDays, rng):
+  return [online.generateInput(online.generateWeather()) for i in range(numDays)]
+
+def batchDays(numDays, rng):
+  return online.generateInputBatch(online.generateWeatherBatch(numDays, rng), rng)
+
+def offlineDays(numDays, rng):
+  with contextlib.redirect_stdout(io.StringIO()):   # offline.generateInput prints every day
+    return [offline.generateInput() for i in range(numDays)]
+
+def runPerDay(method):
+  return lambda days: [method(day) for day in days]
+
+def runCli(args):
+  # a whole headless evaluation in a fresh interpreter, so startup and imports are included
+  subprocess.run([sys.executable, CLI, 'evaluate', '--days', str(args[0]), '--format', 'csv'], check=True,
+                 stdout=subprocess.DEVNULL)
+
+def runOffline(days):
+  with contextlib.redirect_stdout(io.StringIO()):
+    return [offline.EnergyManagementSystem(B_MAX).offlineAlgo(day) for day in days]
+
+EMS = online.EnergyManagementSystem(B_MAX)
+
+# name -> (makeInput(numDays, rng) or None, run(input or (numDays, rng)), largest size or None)
+CASES = {
+  'generateWeather': (None, lambda args: [online.generateWeather() for i in range(args[0])], PER_DAY_MAX),
+  'generateInput': (None, lambda args: scalarDays(*args), PER_DAY_MAX),
+  'generateWeatherBatch': (None, lambda args: online.generateWeatherBatch(args[0], args[1]), None),
+  'generateInputBatch': (None, lambda args: batchDays(*args), None),
+  'offline.generateInput': (None, lambda args: offlineDays(*args), PER_DAY_MAX),
+  'offlineAlgo': (scalarDays, runPerDay(EMS.offlineAlgo), PER_DAY_MAX),
+  'onlineAlgo': (scalarDays, runPerDay(EMS.onlineAlgo), PER_DAY_MAX),
+  'onlineAlgoBetter': (scalarDays, runPerDay(EMS.onlineAlgoBetter), PER_DAY_MAX),
+  'onlineAlgoRandom': (scalarDays, runPerDay(EMS.onlineAlgoRandom), PER_DAY_MAX),
+  'baseline': (scalarDays, runPerDay(EMS.baseline), PER_DAY_MAX),
+  'offline.offlineAlgo': (offlineDays, runOffline, PER_DAY_MAX),
+  'optimalBatch': (batchDays, EMS.optimalBatch, None),
+  'offlineAlgoBatch': (batchDays, EMS.offlineAlgoBatch, None),
+  'onlineAlgoBatch': (batchDays, EMS.onlineAlgoBatch, None),
+  'onlineAlgoBetterBatch': (batchDays, EMS.onlineAlgoBetterBatch, None),
+  'onlineAlgoRandomBatch': (batchDays, EMS.onlineAlgoRandomBatch, None),
+  'baselineBatch': (batchDays, EMS.baselineBatch, None),
+  'cli.evaluate': (None, runCli, PER_DAY_MAX),   # time to first result of a short run
+}
+# Cases whose work runs in another process, out of tracemalloc's sight; they report no peakBytes
+UNTRACED = {'cli.evaluate'}
+
+# Per-day case -> its batch case. The per-day API loops over scalars, so it is slower than the
+# batch kernel, but should stay within PER_DAY_FLOOR of it; run through the kernel one day at a
+# time it drops to about a thousandth, which checkFloors catches without earlier results.
+BATCH_CASES = {
+  'offlineAlgo': 'offlineAlgoBatch',
+  'onlineAlgo': 'onlineAlgoBatch',
+  'onlineAlgoBetter': 'onlineAlgoBetterBatch',
+  'onlineAlgoRandom': 'onlineAlgoRandomBatch',
+  'baseline': 'baselineBatch',
+}
+PER_DAY_FLOOR = 0.005
+
+def hotspots(profile, top):
+  '''
+  Returns the top functions of a cProfile run by cumulative time, as JSON-friendly dicts.
+  '''
+  stats = pstats.Stats(profile, stream=io.StringIO())
+  rows = []
+  for (path, line, name), (calls, primitive, tottime, cumtime, callers) in stats.stats.items():
+    rows.append({'function': '{}:{}({})'.format(os.path.basename(path), line, name), 'calls': calls,
+                 'tottime': tottime, 'cumtime': cumtime})
+  rows.sort(key=lambda row: -row['cumtime'])
+  return rows[:top]
+
+def runCase(name, numDays, repeats=3, seed=42, profile=False, top=15):
+  '''
+  Benchmarks one case on numDays days. Inputs are generated before timing starts; the best of
+  repeats timed runs is reported, and peak memory is traced in a separate run.
+
+  Return:
+  A dict with the case, numDays, seconds, daysPerSec, peakBytes (None for UNTRACED cases) and,
+  when profiling, hotspots.
+  '''
+  makeInput, run, maxDays = CASES[name]
+  def prepare():
+    rng = np.random.default_rng(seed)
+    np.random.seed(seed)
+    return (numDays, rng) if makeInput is None else makeInput(numDays, rng)
+  best = float('inf')
+  for i in range(repeats):
+    data = prepare()
+    start = time.perf_counter()
+    run(data)
+    best = min(best, time.perf_counter() - start)
+  peak = None
+  if name not in UNTRACED:
+    data = prepare()
+    tracemalloc.start()
+    run(data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+  result = {'case': name, 'numDays': numDays, 'seconds': best, 'daysPerSec': numDays / best, 'peakBytes': peak}
+  if profile:
+    data = prepare()
+    profiler = cProfile.Profile()
+    profiler.runcall(run, data)
+    result['hotspots'] = hotspots(profiler, top)
+  return result
+
+def runSuite(cases=None, sizes=SIZES, repeats=3, profile=False, log=None):
+  '''
+  Benchmarks each case at every size it supports, profiling its largest run if asked.
+
+  Return:
+  A dict with the environment ('meta') and a list of runCase results ('results').
+  '''
+  results = []
+  for name in CASES if cases is None else cases:
+    caseSizes = [n for n in sizes if CASES[name][2] is None or n <= CASES[name][2]] or [min(sizes)]
+    for numDays in caseSizes:
+      result = runCase(name, numDays, repeats, profile=profile and numDays == caseSizes[-1])
+      results.append(result)
+      if log is not None:
+        peak = '{:>10.1f} MB peak'.format(result['peakBytes'] / 1e6) if result['peakBytes'] is not None else ''
+        log.write('{:24s} {:>8d} days  {:>12.0f} days/s  {}'.format(name, numDays, result['daysPerSec'], peak).rstrip()
+                  + '\n')
+  meta = {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+          'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+  return {'meta': meta, 'results': results}
+
+def compare(old, new, threshold=0.1):
+  '''
+  Compares two runSuite outputs.
+
+  Return:
+  A list of (case, numDays, oldDaysPerSec, newDaysPerSec) for every run at least threshold
+  (as a fraction) slower in new.
+  '''
+  before = dict(((r['case'], r['numDays']), r['daysPerSec']) for r in old['results'])
+  slower = []
+  for r in new['results']:
+    key = (r['case'], r['numDays'])
+    if key in before and r['daysPerSec'] < before[key] * (1 - threshold):
+      slower.append((r['case'], r['numDays'], before[key], r['daysPerSec']))
+  return slower
+
+def checkFloors(suite, floor=PER_DAY_FLOOR):
+  '''
+  Checks every per-day case in BATCH_CASES against its batch case run on as many days.
+
+  Return:
+  A list of (case, numDays, fraction) for every per-day run slower than floor times its batch run.
+  '''
+  rates = dict(((r['case'], r['numDays']), r['daysPerSec']) for r in suite['results'])
+  below = []
+  for (name, numDays), rate in sorted(rates.items()):
+    key = (BATCH_CASES.get(name), numDays)
+    if key in rates and rate < rates[key] * floor:
+      below.append((name, numDays, rate / rates[key]))
+  return below
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark the day generators and EMS strategies.')
+  parser.add_argument('cases', nargs='*', help='cases to run (default: all): ' + ', '.join(CASES))
+  parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='numbers of days to run each case on')
+  parser.add_argument('--repeats', type=int, default=3, help='timed runs per size; the best is reported')
+  parser.add_argument('--profile', action='store_true', help='profile the largest run of each case')
+  parser.add_argument('--output', default='benchmark.json', help='JSON file to write the results to')
+  parser.add_argument('--compare', help='earlier results to check for slowdowns of more than 10%%')
+  args = parser.parse_args()
+  for name in args.cases:
+    if name not in CASES:
+      parser.error('unknown case {}'.format(name))
+
+  suite = runSuite(args.cases or None, args.sizes, args.repeats, args.profile, sys.stdout)
+  with open(args.output, 'w') as f:
+    json.dump(suite, f, indent=1)
+  below = checkFloors(suite)
+  for case, numDays, fraction in below:
+    print('too slow: {} on {} days runs at {:.4f} of {} (floor {})'.format(case, numDays, fraction,
+                                                                         BATCH_CASES[case], PER_DAY_FLOOR))
+  slower = []
+  if args.compare:
+    with open(args.compare) as f:
+      slower = compare(json.load(f), suite)
+    for case, numDays, before, after in slower:
+      print('slower: {} on {} days, {:.0f} -> {:.0f} days/s'.format(case, numDays, before, after))
+  if slower or below:
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
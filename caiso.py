@@ -0,0 +1,134 @@
+# Loader for the CAISO "Today's Outlook" CSV exports in data/ (see data/sources.txt).
+#
+# Each file holds one day: the first row is "<title> MM/DD/YYYY" followed by 5-minute time stamps,
+# and every other row is one series ("Net demand", "Solar", ...) with one value per time stamp.
+# Parsing the text is slow, so each kind of file is parsed once into a columnar cache in
+# data/cache/ -- a (days x series x steps) .npy array plus the dates and series names -- which
+# later runs memory-map instead of re-reading the CSVs. The cache is rebuilt when the CSVs change.
+
+import datetime
+import glob
+import json
+import os
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+STEP_MINUTES = 5
+STEPS_PER_DAY = 24 * 60 // STEP_MINUTES
+
+# kind -> file name prefix
+KINDS = {
+  'demand': 'CAISO-netdemand',
+  'supply': 'CAISO-supply',
+  'renewables': 'CAISO-renewables',
+}
+
+# kind -> (dates, series names, values) of caches already opened by this process
+loaded = {}
+
+def parseFile(path):
+  '''
+  Parses one CAISO CSV file.
+
+  Return:
+  (date, names, values) where values is a (len(names) x STEPS_PER_DAY) float array. Missing
+  readings are NaN; time stamps past midnight of the next day are dropped.
+  '''
+  with open(path) as f:
+    rows = [line.rstrip('\r\n').split(',') for line in f if line.strip()]
+  header = rows[0]
+  date = datetime.datetime.strptime(header[0].split()[-1], '%m/%d/%Y').date()
+  columns = []
+  for i, stamp in enumerate(header[1:]):
+    if not stamp:
+      continue
+    hour, minute = stamp.split(':')
+    step = (int(hour) * 60 + int(minute)) // STEP_MINUTES
+    if columns and step <= columns[-1][1]:
+      break   # wrapped around to the next day
+    columns.append((i + 1, step))
+  names = [row[0] for row in rows[1:]]
+  values = np.full((len(names), STEPS_PER_DAY), np.nan)
+  for r, row in enumerate(rows[1:]):
+    for i, step in columns:
+      if i < len(row) and row[i]:
+        values[r, step] = float(row[i])
+  return date, names, values
+
+def cachePaths(kind, dataDir):
+  base = os.path.join(dataDir, 'cache', kind)
+  return base + '.npy', base + '-dates.npy', base + '.json'
+
+def sourceFiles(kind, dataDir):
+  return sorted(glob.glob(os.path.join(dataDir, kind, KINDS[kind] + '-*.csv')))
+
+def manifest(files):
+  return [[os.path.basename(f), os.path.getsize(f), os.path.getmtime(f)] for f in files]
+
+def buildCache(kind, dataDir=DATA_DIR):
+  '''
+  Parses every CSV of the given kind and writes the columnar cache. Series missing from a file
+  are NaN for that day.
+  '''
+  files = sourceFiles(kind, dataDir)
+  days = [parseFile(f) for f in files]
+  days.sort(key=lambda day: day[0])
+  names = []
+  for date, dayNames, values in days:
+    names += [name for name in dayNames if name not in names]
+  array = np.full((len(days), len(names), STEPS_PER_DAY), np.nan)
+  for d, (date, dayNames, values) in enumerate(days):
+    for r, name in enumerate(dayNames):
+      array[d, names.index(name)] = values[r]
+  dates = np.array([day[0] for day in days], dtype='datetime64[D]')
+
+  valuesPath, datesPath, metaPath = cachePaths(kind, dataDir)
+  if not os.path.isdir(os.path.dirname(valuesPath)):
+    os.makedirs(os.path.dirname(valuesPath))
+  # write to temporary files first so a reader never sees a half-written cache
+  np.save(valuesPath + '.tmp.npy', array)
+  np.save(datesPath + '.tmp.npy', dates)
+  with open(metaPath + '.tmp', 'w') as f:
+    json.dump({'names': names, 'files': manifest(files)}, f)
+  os.replace(valuesPath + '.tmp.npy', valuesPath)
+  os.replace(datesPath + '.tmp.npy', datesPath)
+  os.replace(metaPath + '.tmp', metaPath)
+
+def loadKind(kind, dataDir=DATA_DIR):
+  '''
+  Returns (dates, names, values) for all files of a kind, where values is a read-only memory-mapped
+  (days x series x STEPS_PER_DAY) array. Builds or refreshes the cache if needed.
+  '''
+  key = (kind, dataDir)
+  if key in loaded:
+    return loaded[key]
+  valuesPath, datesPath, metaPath = cachePaths(kind, dataDir)
+  meta = None
+  if os.path.exists(metaPath):
+    with open(metaPath) as f:
+      meta = json.load(f)
+  if meta is None or meta['files'] != manifest(sourceFiles(kind, dataDir)):
+    buildCache(kind, dataDir)
+    with open(metaPath) as f:
+      meta = json.load(f)
+  loaded[key] = (np.load(datesPath), meta['names'], np.load(valuesPath, mmap_mode='r'))
+  return loaded[key]
+
+def loadSeries(kind, name, start=None, end=None, dataDir=DATA_DIR):
+  '''
+  Returns one series over a date range.
+
+  Parameters:
+  kind       - One of KINDS
+  name       - Series name as it appears in the CSVs, e.g. 'Net demand' or 'Solar'
+  start, end - First and last date to include (datetime.date, 'YYYY-MM-DD' or None for unbounded)
+
+  Return:
+  (dates, values) where values is a (days x STEPS_PER_DAY) view of the memory-mapped cache.
+  '''
+  dates, names, values = loadKind(kind, dataDir)
+  if name not in names:
+    raise KeyError('no series {!r} in CAISO {} data; available: {}'.format(name, kind, names))
+  first = 0 if start is None else np.searchsorted(dates, np.datetime64(start, 'D'))
+  last = len(dates) if end is None else np.searchsorted(dates, np.datetime64(end, 'D'), side='right')
+  return dates[first:last], values[first:last, names.index(name)]
@@ -0,0 +1,197 @@
+# Command line entry point: evaluate the EMS strategies, plot the worst simulated day, or show the
+# grid topology.
+#
+# Meant for headless batch nodes, so only numpy and the simulation modules load up front.
+# matplotlib is imported only when something is plotted, and networkx only by the topology command.
+# A short evaluation then starts in about the time it takes to import numpy. --timing reports the
+# time spent importing and the time to the result on stderr.
+#
+#   python cli.py evaluate --days 10000 --B-max 180 --format json
+#   python cli.py evaluate --strategies online online_better --precision 0.001
+#   python cli.py plot --output worst.png
+#   python cli.py topology
+
+import time
+START = time.perf_counter()   # taken before the other imports, for --timing
+
+import argparse
+import csv
+import json
+import sys
+import numpy as np
+
+import online
+import streamstats
+from online import STRATEGIES
+
+IMPORTED = time.perf_counter()
+FORMATS = ('text', 'json', 'csv')
+COLUMNS = ('strategy', 'days', 'avgProfit', 'profitHalfWidth', 'avgRatio', 'worstRatio', 'ratioOfAverages')
+
+def evaluate(strategies, numDays, B_max=180, seed=42, batchSize=10000, stepsPerHour=1, worstK=0, dtype=np.float64,
+             precision=None):
+  '''
+  Runs some of the strategies on numDays simulated days, generated with float type dtype. The
+  optimal strategy always runs, since ratios are taken against it. Given a precision, stops after
+  the first batch at which every average profit and ratio is known to within that relative
+  precision (95% confidence), so numDays is the most that are run.
+
+  Return:
+  (profits, ratios, worst): dicts mapping each strategy run to RunningStats of its profits and
+  ratios, and a WorstK of the days on which the first strategy given has its worst ratio.
+  '''
+  names = ['optimal'] + [name for name in strategies if name != 'optimal']
+  rng = np.random.default_rng(seed)
+  EMS = online.EnergyManagementSystem(B_max, stepsPerHour)
+  profits = dict((name, streamstats.RunningStats()) for name in names)
+  ratios = dict((name, streamstats.RunningStats()) for name in names)
+  worst = streamstats.WorstK(worstK)
+  for start in range(0, numDays, batchSize):
+    batch = online.generateInputBatch(online.generateWeatherBatch(min(batchSize, numDays - start), rng), rng,
+                                      stepsPerHour, dtype=dtype)
+    dayProfits = EMS.compareBatch(batch, rng, names)
+    for name in names:
+      profits[name].update(dayProfits[name])
+      ratios[name].update(dayProfits[name] / dayProfits['optimal'])
+    if worstK:
+      worst.update(dayProfits[strategies[0]] / dayProfits['optimal'], batch, start)
+    if precision is not None and streamstats.withinPrecision(list(profits.values()) + list(ratios.values()),
+                                                             precision):
+      break
+  return profits, ratios, worst
+
+def evaluateArgs(args, worstK=0):
+  '''
+  evaluate() on the parsed command line.
+  '''
+  return evaluate(args.strategies, args.days, args.B_max, args.seed, args.batch_size, args.steps_per_hour, worstK,
+                  np.dtype(args.dtype).type, getattr(args, 'precision', None))
+
+def table(strategies, profits, ratios):
+  '''
+  One row (a dict over COLUMNS) per strategy.
+  '''
+  return [{'strategy': name, 'days': profits[name].count, 'avgProfit': profits[name].mean,
+           'profitHalfWidth': 1.96 * profits[name].stderr(), 'avgRatio': ratios[name].mean,
+           'worstRatio': ratios[name].max, 'ratioOfAverages': profits[name].mean / profits['optimal'].mean}
+          for name in strategies]
+
+def write(rows, fmt, out):
+  if fmt == 'json':
+    json.dump(rows, out, indent=1)
+    out.write('\n')
+  elif fmt == 'csv':
+    writer = csv.DictWriter(out, fieldnames=COLUMNS)
+    writer.writeheader()
+    writer.writerows(rows)
+  else:
+    out.write('{:14s} {:>8s} {:>12s} {:>9s} {:>9s} {:>9s}\n'.format('strategy', 'days', 'avgProfit', '+-',
+                                                                   'avgRatio', 'worst'))
+    for row in rows:
+      out.write('{strategy:14s} {days:>8d} {avgProfit:>12.2f} {profitHalfWidth:>9.3f} {avgRatio:>9.4f} '
+                '{worstRatio:>9.4f}\n'.format(**row))
+
+def pyplot(output):
+  '''
+  Imports pyplot, with a headless backend when the figure goes to an output file.
+  '''
+  import matplotlib
+  if output is not None:
+    matplotlib.use('Agg')
+  from matplotlib import pyplot as plt
+  return plt
+
+def plotDay(days, output=None):
+  '''
+  Plots the first day of a DayBatch like online.main() does, to output or to the screen.
+  '''
+  plt = pyplot(output)
+  plt.figure()
+  plt.subplot(211)
+  plt.title('Worst Case Data')
+  plt.plot(days.demand[0], label='demand', color='red')
+  plt.plot(days.solar[0], label='solar', color='green')
+  plt.ylabel('kWh')
+  plt.legend()
+  plt.subplot(212)
+  plt.plot(days.price[0], label='price', color='blue')
+  plt.ylabel('USD/kWh')
+  plt.xlabel('Timestep')
+  plt.legend()
+  if output is None:
+    plt.show()
+  else:
+    plt.savefig(output)
+
+def runEvaluate(args):
+  profits, ratios, worst = evaluateArgs(args)
+  rows = table(args.strategies, profits, ratios)
+  if args.output is None:
+    write(rows, args.format, sys.stdout)
+  else:
+    with open(args.output, 'w', newline='') as f:
+      write(rows, args.format, f)
+
+def runPlot(args):
+  profits, ratios, worst = evaluateArgs(args, worstK=1)
+  print('worst {} ratio {:.4f} on day {}'.format(args.strategies[0], worst.keys[0], worst.index[0]))
+  plotDay(worst.days, args.output)
+
+def runTopology(args):
+  import gridflow   # imports networkx for the graph
+  G = gridflow.simpleGrid()
+  for u, v, weight in G.edges(data='weight'):
+    print(u, 'is connected to', v, 'with distance', weight)
+  if args.draw or args.output is not None:
+    import networkx as nx
+    plt = pyplot(args.output)
+    pos = nx.spring_layout(G, seed=args.seed)
+    nx.draw_networkx(G, pos)
+    nx.draw_networkx_edge_labels(G, pos, edge_labels=dict(((u, v), w) for u, v, w in G.edges(data='weight')))
+    if args.output is None:
+      plt.show()
+    else:
+      plt.savefig(args.output)
+
+def parser():
+  p = argparse.ArgumentParser(description='Headless EMS strategy evaluation.')
+  commands = p.add_subparsers(dest='command', required=True)
+  for name, help in (('evaluate', 'average profits and competitive ratios of the strategies'),
+                     ('plot', 'plot the day with the worst ratio of the first strategy')):
+    c = commands.add_parser(name, help=help)
+    c.add_argument('--strategies', nargs='+', choices=STRATEGIES,
+                   default=STRATEGIES if name == 'evaluate' else ['online'], help='strategies to run')
+    c.add_argument('--days', type=int, default=10000, help='days to simulate (the most, with --precision)')
+    c.add_argument('--B-max', type=float, default=180, help='battery capacity in kWh')
+    c.add_argument('--seed', type=int, default=42)
+    c.add_argument('--steps-per-hour', type=int, default=online.STEPS_PER_HOUR)
+    c.add_argument('--batch-size', type=int, default=10000, help='days generated at a time')
+    c.add_argument('--dtype', choices=('float64', 'float32'), default='float64',
+                   help='float type of the generated days; float32 halves their memory')
+    if name == 'evaluate':
+      c.add_argument('--precision', type=float, help='stop once the averages are this precise (relative, 95%%), '
+                                                      'checked after each batch')
+      c.add_argument('--format', choices=FORMATS, default='text')
+      c.add_argument('--output', help='file to write to instead of stdout')
+    else:
+      c.add_argument('--output', help='image file to save the plot to instead of showing it')
+    c.add_argument('--timing', action='store_true', help='report import and run times on stderr')
+  c = commands.add_parser('topology', help='print (or draw) the simple grid of pg-simulate.py')
+  c.add_argument('--draw', action='store_true', help='draw the graph')
+  c.add_argument('--output', help='image file to save the drawing to instead of showing it')
+  c.add_argument('--seed', type=int, default=42, help='seed of the drawing layout')
+  c.add_argument('--timing', action='store_true', help='report import and run times on stderr')
+  return p
+
+COMMANDS = {'evaluate': runEvaluate, 'plot': runPlot, 'topology': runTopology}
+
+def main(argv=None):
+  args = parser().parse_args(argv)
+  COMMANDS[args.command](args)
+  if args.timing:
+    sys.stderr.write('imports {:.3f} s, result {:.3f} s after start\n'.format(
+      IMPORTED - START, time.perf_counter() - START))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+# Streaming EMS controller: makes the online battery decisions one step at a time as readings
+# arrive, instead of over a complete day.
+#
+# Controller.step applies online.stepBattery, the rules of simulateBatch, to a single site, keeping
+# the battery level and running profit between calls; fed the steps of a day in order it earns
+# exactly the profit of the matching batch strategy. Each step only touches a handful of scalars,
+# so its cost and memory use stay flat however long the controller runs. SiteControllers serves
+# many sites from one asyncio event loop.
+
+import collections
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+import online
+
+# The decision for one step: the battery level to hold until the next step (kWh), and the energy
+# traded with the grid over this step (kWh, positive when selling, negative when buying).
+Action = collections.namedtuple('Action', ['battery', 'grid'])
+
+class Controller():
+  '''
+  Online battery controller for one site.
+
+  Parameters:
+  B_max        - Battery capacity in kWh
+  strategy     - Name of an online strategy in online.PREDICTORS
+  stepsPerHour - Time resolution of the readings
+  kwargs       - Passed to the predictor, e.g. rng for 'random'
+  '''
+  def __init__(self, B_max, strategy='online_better', stepsPerHour=1, **kwargs):
+    self.ems = online.EnergyManagementSystem(B_max, stepsPerHour)
+    self.predictor = online.PREDICTORS[strategy](self.ems, **kwargs)
+    if self.predictor.needsFuture:
+      raise ValueError('strategy {} needs future readings and cannot run online'.format(strategy))
+    self.B_max = B_max
+    self.numSteps = online.HOURS_IN_DAY * stepsPerHour
+    self.reset()
+
+  def reset(self):
+    '''
+    Starts a new day with an empty battery.
+    '''
+    self.battery = 0.0
+    self.profit = 0.0
+
+  def step(self, t, demand, people, solar, price):
+    '''
+    Takes the readings for step t of the day and returns the Action for it. Step 0 starts a new
+    day; the steps of a day must be fed in order.
+    '''
+    if t == 0:
+      self.reset()
+    predPrice = self.predictor.predictStep(t, demand, people, solar, price)
+    hold = self.predictor.holdLastStep and t == self.numSteps - 1
+    grid, trade, self.battery = online.stepBattery(self.battery, demand, solar, price, predPrice, self.B_max, hold)
+    self.profit += grid * price
+    self.profit += trade * price
+    return Action(self.battery, grid + trade)
+
+class SiteControllers():
+  '''
+  Controllers for many sites, served from one asyncio event loop. Each site gets its own
+  Controller, created on first use by makeController(site).
+  '''
+  def __init__(self, makeController):
+    self.makeController = makeController
+    self.controllers = {}
+
+  def controller(self, site):
+    if site not in self.controllers:
+      self.controllers[site] = self.makeController(site)
+    return self.controllers[site]
+
+  async def step(self, site, t, demand, people, solar, price):
+    '''
+    Returns the Action for one site's readings. A step never waits, so concurrent sites cannot
+    interleave within it.
+    '''
+    return self.controller(site).step(t, demand, people, solar, price)
+
+  async def serve(self, site, readings):
+    '''
+    Consumes an async iterable of (t, demand, people, solar, price) readings for one site and
+    yields an Action for each. Serve every site's feed concurrently, e.g. with asyncio.gather.
+    '''
+    controller = self.controller(site)
+    async for reading in readings:
+      yield controller.step(*reading)
+
+def benchmark(numDays=1000, strategy='online_better', B_max=180, stepsPerHour=1, seed=42):
+  '''
+  Times Controller.step over simulated days, one call per step.
+
+  Return:
+  A dict with the median, 99th percentile and maximum step latency in microseconds, and the
+  growth in traced memory between the first and the last half of the run, in bytes.
+  '''
+  rng = np.random.default_rng(seed)
+  batch = online.generateInputBatch(online.generateWeatherBatch(numDays, rng), rng, stepsPerHour)
+  days = [online.toDayList(batch, i) for i in range(numDays)]
+  controller = Controller(B_max, strategy, stepsPerHour)
+  latencies = np.empty(numDays * batch.price.shape[1])
+  timer = time.perf_counter_ns
+  n = 0
+  for day in days:
+    for reading in day:
+      start = timer()
+      controller.step(*reading)
+      latencies[n] = timer() - start
+      n += 1
+  # memory is traced in a second pass, since tracing slows every allocation down
+  tracemalloc.start()
+  for i, day in enumerate(days):
+    if i == numDays // 2:
+      halfway = tracemalloc.get_traced_memory()[0]
+    for reading in day:
+      controller.step(*reading)
+  growth = tracemalloc.get_traced_memory()[0] - halfway
+  tracemalloc.stop()
+  latencies /= 1000.0
+  return {'medianUs': np.median(latencies), 'p99Us': np.percentile(latencies, 99),
+          'maxUs': latencies.max(), 'memoryGrowthBytes': growth}
+
+def main():
+  numDays = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+  for strategy in ('online', 'online_better', 'random'):
+    r = benchmark(numDays, strategy)
+    print('{}:\t median {:.1f} us\t p99 {:.1f} us\t max {:.1f} us\t memory growth {} bytes'.format(
+      strategy, r['medianUs'], r['p99Us'], r['maxUs'], r['memoryGrowthBytes']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# Fleet simulation: many buildings, each with its own EMS, stepped in lockstep.
+#
+# Instead of one EnergyManagementSystem object and one Python loop per site, a Fleet keeps every
+# per-site quantity -- capacity, headcount, profit, weather -- in an array with one entry per site,
+# and runs each day of all sites as one batch through online.simulateBatch, one row per site. Sites
+# can differ in battery capacity and in number of employees.
+
+import sys
+import time
+import numpy as np
+
+import online
+
+class Fleet():
+  '''
+  Array-backed state of a fleet of sites running the same online strategy.
+
+  Parameters:
+  numSites     - The number of sites
+  B_max        - Battery capacity in kWh, for all sites or one per site
+  numEmployees - Headcount of each building, for all sites or one per site (default NUM_EMPLOYEES)
+  strategy     - Name of an online strategy in online.PREDICTORS
+  stepsPerHour - Time resolution of the simulated days
+  kwargs       - Passed to the predictor, e.g. rng for 'random'
+
+  Per-site state, each an array of numSites entries (weather is numSites x 5):
+  B_max, numEmployees, profit (today's), totalProfit, people (latest headcount), weather (today's)
+  '''
+  def __init__(self, numSites, B_max=180, numEmployees=None, strategy='online_better', stepsPerHour=1, **kwargs):
+    self.numSites = numSites
+    self.stepsPerHour = stepsPerHour
+    self.numSteps = online.HOURS_IN_DAY * stepsPerHour
+    self.B_max = np.array(np.broadcast_to(B_max, numSites), dtype=float)
+    numEmployees = online.NUM_EMPLOYEES if numEmployees is None else numEmployees
+    self.numEmployees = np.array(np.broadcast_to(numEmployees, numSites), dtype=int)
+    self.ems = online.EnergyManagementSystem(self.B_max, stepsPerHour, self.numEmployees)
+    self.predictor = online.PREDICTORS[strategy](self.ems, **kwargs)
+    if self.predictor.needsFuture:
+      raise ValueError('strategy {} needs future readings and cannot run online'.format(strategy))
+    self.profit = np.zeros(numSites)
+    self.totalProfit = np.zeros(numSites)
+    self.people = np.zeros(numSites, dtype=int)
+    self.weather = np.zeros((numSites, 5))
+
+  def newDay(self, rng=np.random):
+    '''
+    Draws today's weather for every site.
+
+    Return:
+    A DayBatch with the day's readings, one row per site.
+    '''
+    self.weather = online.generateWeatherBatch(self.numSites, rng)
+    return online.generateInputBatch(self.weather, rng, self.stepsPerHour, self.numEmployees)
+
+  def runDay(self, batch):
+    '''
+    Runs every site through one day of readings (a DayBatch with one row per site), starting
+    with empty batteries. The predictor's EMS holds each site's headcount and the kernel each
+    site's capacity, so row i runs as site i.
+
+    Return:
+    The day's profit of each site.
+    '''
+    self.profit[:] = online.simulateBatch(batch, self.B_max, self.predictor)
+    self.people[:] = batch.people[:, -1]
+    self.totalProfit += self.profit
+    return self.profit.copy()
+
+  def simulate(self, numDays, rng=np.random):
+    '''
+    Simulates numDays days of fresh readings at every site.
+
+    Return:
+    A (numDays x numSites) array of daily profits.
+    '''
+    profits = np.empty((numDays, self.numSites))
+    for day in range(numDays):
+      profits[day] = self.runDay(self.newDay(rng))
+    return profits
+
+def main():
+  numSites = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+  numDays = int(sys.argv[2]) if len(sys.argv) > 2 else 365
+  rng = np.random.default_rng(42)
+  fleet = Fleet(numSites, B_max=rng.uniform(0, 360, numSites), numEmployees=rng.integers(20, 200, numSites))
+  start = time.time()
+  profits = fleet.simulate(numDays, rng)
+  print('{} sites x {} days in {:.1f} s; average daily profit {:.2f}'.format(numSites, numDays, time.time() - start,
+                                                                            profits.mean()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+# Learned demand and price forecaster, an alternative to the hand-coded predictDemand/predictPrice
+# in online.py.
+#
+# For every step t of the day, a linear regression predicts step t + 1's demand and price from
+# step t's demand, headcount and price. Training only accumulates the normal equations (X'X and
+# X'Y per step), so any number of days can be streamed through it a batch at a time, from a
+# scenario set (scenarios.py) or from real CAISO days (replay.py), and training can be resumed
+# from a saved model. Fitted models are saved as .npz files and loaded on first use.
+
+import os
+import sys
+import numpy as np
+
+import online
+
+MODEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'cache', 'forecast.npz')
+FEATURES = ('intercept', 'demand', 'people', 'price')
+TARGETS = ('demand', 'price')
+
+# path -> LinearForecaster already loaded by this process
+loaded = {}
+
+def features(demand, people, price):
+  '''
+  Stacks the readings of a step (scalars, or arrays of any shape) into a (... x len(FEATURES)) array.
+  '''
+  demand = np.asarray(demand, dtype=float)
+  return np.stack([np.ones_like(demand), demand, np.asarray(people, dtype=float),
+                   np.asarray(price, dtype=float)], axis=-1)
+
+class LinearForecaster():
+  '''
+  Per-step linear regression of the next step's demand and price on the current readings.
+
+  stepsPerHour - Time resolution of the days it is trained on and predicts
+  xtx, xty     - Normal equations accumulated so far, one per step transition
+  coef         - Fitted (numSteps - 1 x len(FEATURES) x len(TARGETS)) coefficients, or None before fit()
+  numDays      - The number of days trained on
+  '''
+  def __init__(self, stepsPerHour=1):
+    self.stepsPerHour = stepsPerHour
+    self.numSteps = online.HOURS_IN_DAY * stepsPerHour
+    self.xtx = np.zeros((self.numSteps - 1, len(FEATURES), len(FEATURES)))
+    self.xty = np.zeros((self.numSteps - 1, len(FEATURES), len(TARGETS)))
+    self.coef = None
+    self.numDays = 0
+
+  def update(self, batch):
+    '''
+    Adds the days of a DayBatch to the training data.
+    '''
+    if batch.price.shape[1] != self.numSteps:
+      raise ValueError('expected days of {} steps, got {}'.format(self.numSteps, batch.price.shape[1]))
+    x = features(batch.demand[:, :-1], batch.people[:, :-1], batch.price[:, :-1])
+    y = np.stack([batch.demand[:, 1:], batch.price[:, 1:]], axis=-1)
+    self.xtx += np.einsum('dsi,dsj->sij', x, x)
+    self.xty += np.einsum('dsi,dsj->sij', x, y)
+    self.numDays += batch.price.shape[0]
+
+  def fit(self):
+    '''
+    Solves the accumulated normal equations. Uses the pseudo-inverse, since some features are
+    constant at some steps (nobody is in at night).
+    '''
+    self.coef = np.matmul(np.linalg.pinv(self.xtx), self.xty)
+    return self
+
+  def forecast(self, t, demand, people, price):
+    '''
+    Predicts step t + 1 from the readings at step t, given as scalars or one per day.
+
+    Return:
+    (demand, price) predicted for step t + 1. After the last step of the day the price is 0,
+    like Tariff.horizonPrice, and the demand is carried over.
+    '''
+    if t >= self.numSteps - 1:
+      return demand, 0
+    prediction = np.matmul(features(demand, people, price), self.coef[t])
+    return prediction[..., 0], prediction[..., 1]
+
+  def predict(self, batch):
+    '''
+    Predicts every step of every day in a DayBatch from the step before it.
+
+    Return:
+    (demand, price) arrays shaped like the batch's; column t + 1 holds the forecast made at step
+    t, and column 0 the readings themselves.
+    '''
+    x = features(batch.demand[:, :-1], batch.people[:, :-1], batch.price[:, :-1])
+    prediction = np.einsum('dsi,sij->dsj', x, self.coef)
+    demand = np.array(batch.demand, dtype=float)
+    price = np.array(batch.price, dtype=float)
+    demand[:, 1:] = prediction[..., 0]
+    price[:, 1:] = prediction[..., 1]
+    return demand, price
+
+  def save(self, path=MODEL_FILE):
+    '''
+    Saves the model, including the normal equations so training can continue after loading.
+    '''
+    if not os.path.isdir(os.path.dirname(os.path.abspath(path))):
+      os.makedirs(os.path.dirname(os.path.abspath(path)))
+    with open(path + '.tmp', 'wb') as f:
+      np.savez(f, stepsPerHour=self.stepsPerHour, xtx=self.xtx, xty=self.xty, numDays=self.numDays,
+               coef=np.zeros(0) if self.coef is None else self.coef)
+    os.replace(path + '.tmp', path)
+    loaded.pop(path, None)
+
+  @classmethod
+  def load(cls, path=MODEL_FILE):
+    with np.load(path) as data:
+      forecaster = cls(int(data['stepsPerHour']))
+      forecaster.xtx = data['xtx']
+      forecaster.xty = data['xty']
+      forecaster.numDays = int(data['numDays'])
+      forecaster.coef = data['coef'] if data['coef'].size else None
+    return forecaster
+
+def loadForecaster(path=MODEL_FILE):
+  '''
+  Returns the fitted forecaster saved at path, reading it only once per process.
+  '''
+  if path not in loaded:
+    forecaster = LinearForecaster.load(path)
+    loaded[path] = forecaster if forecaster.coef is not None else forecaster.fit()
+  return loaded[path]
+
+class SavedForecaster():
+  '''
+  Stands in for the forecaster saved at path and loads it on the first forecast, so strategies
+  can be set up with a model without paying for reading it until it is used. Only the model's
+  stepsPerHour is read up front, so predictors can check it against their EMS.
+  '''
+  def __init__(self, path=MODEL_FILE):
+    self.path = path
+    if path in loaded:
+      self.stepsPerHour = loaded[path].stepsPerHour
+    else:
+      with np.load(path) as data:
+        self.stepsPerHour = int(data['stepsPerHour'])
+
+  def forecast(self, t, demand, people, price):
+    return loadForecaster(self.path).forecast(t, demand, people, price)
+
+  def predict(self, batch):
+    return loadForecaster(self.path).predict(batch)
+
+def train(batches, stepsPerHour=1, forecaster=None):
+  '''
+  Streams training days into a forecaster and fits it.
+
+  Parameters:
+  batches      - An iterable of (key, DayBatch) pairs, such as ScenarioSet.batches() or
+                 replay.replayBatches()
+  stepsPerHour - Time resolution of the days, for a new forecaster
+  forecaster   - A forecaster to continue training instead of starting a new one
+
+  Return:
+  The fitted LinearForecaster.
+  '''
+  forecaster = LinearForecaster(stepsPerHour) if forecaster is None else forecaster
+  for key, batch in batches:
+    forecaster.update(batch)
+  return forecaster.fit()
+
+def main():
+  # train on a scenario set (or fresh simulated days) and compare against the hand-coded predictor
+  path = sys.argv[1] if len(sys.argv) > 1 else None
+  rng = np.random.default_rng(42)
+  if path is None:
+    batches = ((i, online.generateInputBatch(online.generateWeatherBatch(10000, rng), rng)) for i in range(10))
+    forecaster = train(batches)
+  else:
+    import scenarios
+    scenarioSet = scenarios.ScenarioSet(path)
+    forecaster = train(scenarioSet.batches(), scenarioSet.stepsPerHour)
+  forecaster.save()
+  print('trained on {} days, saved to {}'.format(forecaster.numDays, MODEL_FILE))
+
+  test = online.generateInputBatch(online.generateWeatherBatch(10000, rng), rng, forecaster.stepsPerHour)
+  EMS = online.EnergyManagementSystem(180, forecaster.stepsPerHour)
+  optimalProfit = EMS.optimalBatch(test).mean()
+  for name, model in (('hand-coded', None), ('learned', SavedForecaster())):
+    profit = EMS.onlineAlgoBetterBatch(test, model).mean()
+    print('{}:\t average profit {}\t ratio {}'.format(name, profit, profit / optimalProfit))
+
+
+if __name__ == '__main__':
+    main()
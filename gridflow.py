@@ -0,0 +1,220 @@
+# Dispatch over grid topologies like simpleGrid, the one pg-simulate.py draws.
+#
+# A grid is a directed multigraph of units. Generating units (WindFarm, SolarFarm, Battery,
+# PowerPlant) can inject up to their available supply, consuming units (Neighborhood) draw their
+# demand, and lines carry energy with a capacity and a loss proportional to their length (the
+# edge weight). Each timestep is a min-cost flow with losses:
+#   minimize   sum_e cost_e x_e + sum_n genCost_n g_n + SHED_COST * sum_n u_n
+#   subject to (1 - loss_e) * inflow_n - outflow_n + g_n + u_n = demand_n   for every unit n
+#              0 <= x_e <= capacity_e,  0 <= g_n <= supply_n,  0 <= u_n <= demand_n
+# where u is demand left unserved. The node-edge incidence is compiled once into a sparse CSR
+# constraint matrix shared by every timestep, so dispatching never walks the graph again; only the
+# bounds and right-hand side change from one timestep to the next.
+#
+# Consecutive timesteps usually differ only a little, so IncrementalDispatch keeps the model loaded
+# in the HiGHS solver (the optional highspy package) along with its factorized optimal basis,
+# changes only the bounds that moved, and lets dual simplex continue from the previous optimum.
+
+import collections
+import numpy as np
+import scipy.optimize
+import scipy.sparse
+
+# Units of simpleGrid. vertex: tuple of (name of unit, generation=+1/consumption=-1)
+W = ('WindFarm', 1)
+S = ('SolarFarm', 1)
+D = ('Neighborhood', -1)
+B = ('Battery', 1)
+P = ('PowerPlant', 1)
+
+SHED_COST = 1e6   # cost per unit of demand left unserved; far above any dispatch cost
+# Dual simplex without presolve: the timestep LPs are small and presolving them again every
+# timestep costs more than it saves
+SOLVER_OPTIONS = {'presolve': False}
+
+# The dispatch of a run of timesteps, each a (numSteps x ...) array: flow on each edge (as sent),
+# generation and unserved demand at each unit, and the cost of each timestep
+GridFlow = collections.namedtuple('GridFlow', ['flow', 'generation', 'unmet', 'cost'])
+
+class GridModel():
+  '''
+  A compiled grid topology.
+
+  Parameters:
+  nodes           - Unit names, in the order supply and demand arrays use
+  tails, heads    - Edge endpoints as indices into nodes (energy flows tail -> head)
+  weights         - Edge lengths
+  capacities      - Most energy each edge can carry per timestep (np.inf for no limit)
+  lossPerDistance - Fraction of the energy sent that is lost per unit of length
+  costPerDistance - Cost per unit of energy sent per unit of length
+  genCost         - Cost per unit of energy generated at each unit (default 0)
+  '''
+  def __init__(self, nodes, tails, heads, weights, capacities=None, lossPerDistance=0.01, costPerDistance=1.0,
+               genCost=None):
+    self.nodes = list(nodes)
+    self.index = dict((node, i) for i, node in enumerate(self.nodes))
+    self.tails = np.asarray(tails, dtype=int)
+    self.heads = np.asarray(heads, dtype=int)
+    self.weights = np.asarray(weights, dtype=float)
+    numNodes, numEdges = len(self.nodes), len(self.tails)
+    self.capacities = np.full(numEdges, np.inf) if capacities is None else np.asarray(capacities, dtype=float)
+    self.delivered = 1 - lossPerDistance * self.weights
+    if (self.delivered <= 0).any():
+      raise ValueError('an edge loses all of its flow; lower lossPerDistance')
+    self.edgeCost = costPerDistance * self.weights
+    self.genCost = np.zeros(numNodes) if genCost is None else np.asarray(genCost, dtype=float)
+
+    # balance rows: -1 where an edge leaves a unit, the delivered fraction where it arrives,
+    # then one generation and one unserved column per unit
+    edges = np.arange(numEdges)
+    incidence = scipy.sparse.csr_matrix(
+      (np.concatenate([-np.ones(numEdges), self.delivered]),
+       (np.concatenate([self.tails, self.heads]), np.concatenate([edges, edges]))), shape=(numNodes, numEdges))
+    identity = scipy.sparse.identity(numNodes, format='csr')
+    self.balance = scipy.sparse.hstack([incidence, identity, identity], format='csr')
+    self.stepCost = np.concatenate([self.edgeCost, self.genCost, np.full(numNodes, SHED_COST)])
+
+  @classmethod
+  def fromGraph(cls, G, weight='weight', capacity='capacity', **kwargs):
+    '''
+    Compiles a networkx (Multi)DiGraph. Edges without a capacity attribute are unlimited.
+    '''
+    nodes = list(G.nodes)
+    index = dict((node, i) for i, node in enumerate(nodes))
+    tails, heads, weights, capacities = [], [], [], []
+    for u, v, data in G.edges(data=True):
+      tails.append(index[u])
+      heads.append(index[v])
+      weights.append(data.get(weight, 0))
+      capacities.append(data.get(capacity, np.inf))
+    return cls(nodes, tails, heads, weights, capacities, **kwargs)
+
+  def vector(self, values, default=0.0):
+    '''
+    Turns {node: value} into an array over the nodes, leaving arrays as they are.
+    '''
+    if isinstance(values, dict):
+      return np.array([values.get(node, default) for node in self.nodes], dtype=float)
+    return np.asarray(values, dtype=float)
+
+  def solve(self, supply, demand):
+    '''
+    Dispatches a run of timesteps.
+
+    Parameters:
+    supply - Energy each unit can generate, (numSteps x numNodes) or {node: amount}, or one row
+             for every timestep
+    demand - Energy each unit consumes, likewise
+
+    Return:
+    A GridFlow.
+    '''
+    supply, demand = np.broadcast_arrays(np.atleast_2d(self.vector(supply)), np.atleast_2d(self.vector(demand)))
+    numSteps, numNodes = demand.shape
+    numEdges = len(self.tails)
+    solution = np.empty((numSteps, numEdges + 2 * numNodes))
+    bounds = np.zeros((numEdges + 2 * numNodes, 2))
+    bounds[:numEdges, 1] = self.capacities
+    for t in range(numSteps):
+      bounds[numEdges:numEdges + numNodes, 1] = supply[t]
+      bounds[numEdges + numNodes:, 1] = demand[t]
+      result = scipy.optimize.linprog(self.stepCost, A_eq=self.balance, b_eq=demand[t], bounds=bounds,
+                                      method='highs-ds', options=SOLVER_OPTIONS)
+      if result.status != 0:
+        raise RuntimeError('dispatch failed at timestep {}: {}'.format(t, result.message))
+      solution[t] = result.x
+    return self.toGridFlow(solution)
+
+  def toGridFlow(self, solution):
+    '''
+    Splits (numSteps x variables) LP solutions into a GridFlow.
+    '''
+    numEdges, numNodes = len(self.tails), len(self.nodes)
+    flow = solution[:, :numEdges]
+    generation = solution[:, numEdges:numEdges + numNodes]
+    unmet = solution[:, numEdges + numNodes:]
+    cost = flow @ self.edgeCost + generation @ self.genCost + unmet.sum(axis=1) * SHED_COST
+    return GridFlow(flow, generation, unmet, cost)
+
+  def solveIncremental(self, supply, demand):
+    '''
+    Like solve, but warm-starts every timestep from the previous one (see IncrementalDispatch).
+    Needs the highspy package.
+    '''
+    supply, demand = np.broadcast_arrays(np.atleast_2d(self.vector(supply)), np.atleast_2d(self.vector(demand)))
+    dispatch = IncrementalDispatch(self)
+    return self.toGridFlow(np.array([dispatch.step(supply[t], demand[t]) for t in range(len(demand))]))
+
+class IncrementalDispatch():
+  '''
+  Dispatches consecutive timesteps on one GridModel. The LP stays loaded in a HiGHS instance
+  between timesteps: each step only updates the supply and demand bounds that changed, and the
+  solver starts from the previous optimal basis, so a small change costs a few simplex iterations
+  instead of a solve from scratch.
+  '''
+  def __init__(self, model):
+    import highspy   # optional: only incremental dispatch needs it
+    self.model = model
+    numEdges, numNodes = len(model.tails), len(model.nodes)
+    self.generationColumns = np.arange(numEdges, numEdges + numNodes, dtype=np.int32)
+    self.unmetColumns = np.arange(numEdges + numNodes, numEdges + 2 * numNodes, dtype=np.int32)
+    self.rows = np.arange(numNodes, dtype=np.int32)
+
+    matrix = model.balance.tocsc()
+    lp = highspy.HighsLp()
+    lp.num_col_ = matrix.shape[1]
+    lp.num_row_ = matrix.shape[0]
+    lp.col_cost_ = model.stepCost
+    lp.col_lower_ = np.zeros(matrix.shape[1])
+    lp.col_upper_ = np.concatenate([model.capacities, np.zeros(2 * numNodes)])
+    lp.row_lower_ = np.zeros(numNodes)
+    lp.row_upper_ = np.zeros(numNodes)
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+    lp.a_matrix_.start_ = matrix.indptr
+    lp.a_matrix_.index_ = matrix.indices
+    lp.a_matrix_.value_ = matrix.data
+    self.highs = highspy.Highs()
+    self.highs.setOptionValue('output_flag', False)
+    self.highs.passModel(lp)
+    self.optimal = highspy.HighsModelStatus.kOptimal
+    self.supply = np.zeros(numNodes)
+    self.demand = np.zeros(numNodes)
+
+  def step(self, supply, demand):
+    '''
+    Dispatches the next timestep, given each unit's supply and demand.
+
+    Return:
+    The LP solution (flows, generation, unserved demand), as GridModel.toGridFlow takes.
+    '''
+    supply = self.model.vector(supply)
+    demand = self.model.vector(demand)
+    changed = np.flatnonzero(supply != self.supply)
+    if len(changed):
+      self.highs.changeColsBounds(len(changed), self.generationColumns[changed], np.zeros(len(changed)), supply[changed])
+    changed = np.flatnonzero(demand != self.demand)
+    if len(changed):
+      self.highs.changeColsBounds(len(changed), self.unmetColumns[changed], np.zeros(len(changed)), demand[changed])
+      self.highs.changeRowsBounds(len(changed), self.rows[changed], demand[changed], demand[changed])
+    self.supply = supply.copy()
+    self.demand = demand.copy()
+    self.highs.run()
+    if self.highs.getModelStatus() != self.optimal:
+      raise RuntimeError('dispatch failed: ' + self.highs.modelStatusToString(self.highs.getModelStatus()))
+    return np.array(self.highs.getSolution().col_value)
+
+def simpleGrid():
+  '''
+  The grid pg-simulate.py draws, as a networkx MultiDiGraph: wind and solar farms feeding a
+  battery and a neighborhood over edges weighted by distance, and an unconnected power plant.
+  '''
+  import networkx as nx   # only needed to build graphs
+  G = nx.MultiDiGraph()
+  for node in (W, S, D, B, P):
+    G.add_node(node)
+  G.add_edge(W, B, weight=3)
+  G.add_edge(S, B, weight=4)
+  G.add_edge(S, D, weight=6)
+  G.add_edge(W, D, weight=5)
+  G.add_edge(B, D, weight=3)
+  return G
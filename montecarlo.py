@@ -0,0 +1,202 @@
+# Monte Carlo comparison of the EMS strategies in online.py, sharded across processes.
+# Days are split into fixed-size shards, and shard i always draws from the i-th generator spawned
+# off the root seed, so results do not depend on how many workers run the shards. Shards can also
+# read their days from a stored scenario set (see scenarios.py) instead of generating them.
+# runUntil draws shards from the same seeds, but stops as soon as the estimates are precise enough
+# instead of after a fixed number of days.
+
+import multiprocessing
+import os
+import sys
+import time
+import numpy as np
+
+import online
+import scenarios
+import streamstats
+from online import STRATEGIES
+
+SHARD_SIZE = 10000
+ADAPTIVE_SHARD_SIZE = 2000   # finer shards let runUntil stop closer to the precision it needs
+
+def runShard(args):
+  '''
+  Simulates one shard of days and returns its streaming statistics.
+
+  Parameters:
+  args - (numDays, seedSequence, B_max, worstK, stepsPerHour, source) tuple, packed so the function
+         can be mapped over a pool. source is None to generate the days, or the (path, first day)
+         of the shard's days in a scenario set.
+
+  Return:
+  (profits, ratios, worst): dicts mapping each strategy to RunningStats of its profits and of its
+  competitive ratios against the optimal offline plan, and a WorstK of the days with the worst online ratio.
+  '''
+  numDays, seed, B_max, worstK, stepsPerHour, source = args
+  rng = np.random.default_rng(seed)
+  if source is None:
+    weather = online.generateWeatherBatch(numDays, rng)
+    batch = online.generateInputBatch(weather, rng, stepsPerHour)
+  else:
+    path, start = source
+    batch = scenarios.ScenarioSet(path).batch(start, start + numDays)
+  dayProfits = online.EnergyManagementSystem(B_max, stepsPerHour).compareBatch(batch, rng)
+  profits = dict((name, streamstats.RunningStats()) for name in STRATEGIES)
+  ratios = dict((name, streamstats.RunningStats()) for name in STRATEGIES)
+  for name in STRATEGIES:
+    profits[name].update(dayProfits[name])
+    ratios[name].update(dayProfits[name] / dayProfits['optimal'])
+  worst = streamstats.WorstK(worstK)
+  worst.update(dayProfits['online'] / dayProfits['optimal'], batch)
+  return profits, ratios, worst
+
+def runMonteCarlo(numDays, seed=42, B_max=180, workers=None, shardSize=SHARD_SIZE, worstK=10, stepsPerHour=1,
+                  scenarioPath=None):
+  '''
+  Runs the strategy comparison over numDays simulated days on a pool of worker processes.
+
+  Parameters:
+  numDays      - The number of days to simulate
+  seed         - Root seed; each shard gets its own generator spawned from it
+  B_max        - Battery capacity in kWh
+  workers      - Number of worker processes (default: one per CPU; 1 runs in this process)
+  shardSize    - Days per shard. Changing it changes which random days are drawn.
+  worstK       - Number of worst online-ratio days to keep
+  stepsPerHour - Time resolution of the simulated days
+  scenarioPath - Replay the first numDays days of this scenario set instead of generating days;
+                 seed then only drives the random strategy, and stepsPerHour is the set's
+
+  Return:
+  (profits, ratios, worst) as returned by runShard, merged over all shards. Memory does not
+  grow with numDays.
+  '''
+  if scenarioPath is not None:
+    scenarioSet = scenarios.ScenarioSet(scenarioPath)
+    if numDays > scenarioSet.numDays:
+      raise ValueError('{} only holds {} days'.format(scenarioPath, scenarioSet.numDays))
+    stepsPerHour = scenarioSet.stepsPerHour
+  counts = [shardSize] * (numDays // shardSize)
+  if numDays % shardSize:
+    counts.append(numDays % shardSize)
+  seeds = np.random.SeedSequence(seed).spawn(len(counts))
+  starts = np.cumsum([0] + counts[:-1])
+  shards = [(count, s, B_max, worstK, stepsPerHour, None if scenarioPath is None else (scenarioPath, start))
+            for count, s, start in zip(counts, seeds, starts)]
+  if workers == 1:
+    return mergeShards(counts, map(runShard, shards), worstK)
+  with multiprocessing.Pool(workers) as pool:
+    return mergeShards(counts, pool.imap(runShard, shards), worstK)
+
+def mergeShards(counts, partials, worstK):
+  '''
+  Merges the results of runShard, in shard order so the floating point results are the same for
+  any worker count.
+
+  Parameters:
+  counts   - The number of days in each shard
+  partials - An iterable of runShard results, one per shard
+
+  Return:
+  (profits, ratios, worst) as returned by runShard, with the worst days indexed over all shards.
+  '''
+  profits = dict((name, streamstats.RunningStats()) for name in STRATEGIES)
+  ratios = dict((name, streamstats.RunningStats()) for name in STRATEGIES)
+  worst = streamstats.WorstK(worstK)
+  offset = 0
+  for count, (shardProfits, shardRatios, shardWorst) in zip(counts, partials):
+    for name in STRATEGIES:
+      profits[name].merge(shardProfits[name])
+      ratios[name].merge(shardRatios[name])
+    shardWorst.index += offset
+    worst.merge(shardWorst)
+    offset += count
+  return profits, ratios, worst
+
+def runUntil(precision=1e-3, B_max=180, seed=42, workers=1, shardSize=ADAPTIVE_SHARD_SIZE, minDays=None,
+             maxDays=10 ** 7, worstK=10, stepsPerHour=1, log=None):
+  '''
+  Runs the strategy comparison one shard at a time until every strategy's average profit and
+  average competitive ratio are known to within a relative precision (95% confidence).
+
+  Parameters:
+  precision - Target half-width of the confidence intervals, relative to the estimate
+  workers   - Number of worker processes (default 1: run in this process; None: one per CPU).
+              Shards run in waves of one per worker, and the stopping rule is still checked after
+              each shard in order, so the result does not depend on the number of workers.
+  minDays   - Days to run before checking (default one shard)
+  maxDays   - Days to stop at even if the precision is not reached; the last shard is cut short
+              so no more are run
+  log       - A stream to report each shard's estimates to, or None
+  The rest are as in runMonteCarlo; shard i draws the same days as in runMonteCarlo.
+
+  Return:
+  (profits, ratios, worst, shards): as from runMonteCarlo, plus a list of (days so far, seconds)
+  for each shard run, the seconds being wall time per shard of its wave.
+  '''
+  minDays = shardSize if minDays is None else minDays
+  root = np.random.SeedSequence(seed)
+  pool = None if workers == 1 else multiprocessing.Pool(workers)
+  wave = 1 if pool is None else workers or os.cpu_count()
+  profits = dict((name, streamstats.RunningStats()) for name in STRATEGIES)
+  ratios = dict((name, streamstats.RunningStats()) for name in STRATEGIES)
+  worst = streamstats.WorstK(worstK)
+  shards = []
+  days = 0
+  done = False
+  try:
+    while not done:
+      # shards are cut short where they would run past maxDays
+      sizes = []
+      for i in range(wave):
+        size = min(shardSize, maxDays - days - sum(sizes))
+        if size <= 0:
+          break
+        sizes.append(size)
+      args = [(size, s, B_max, worstK, stepsPerHour, None) for size, s in zip(sizes, root.spawn(len(sizes)))]
+      start = time.time()
+      partials = list(map(runShard, args)) if pool is None else pool.map(runShard, args)
+      seconds = (time.time() - start) / len(sizes)
+      for size, (shardProfits, shardRatios, shardWorst) in zip(sizes, partials):
+        for name in STRATEGIES:
+          profits[name].merge(shardProfits[name])
+          ratios[name].merge(shardRatios[name])
+        shardWorst.index += days
+        worst.merge(shardWorst)
+        days += size
+        shards.append((days, seconds))
+        if log is not None:
+          log.write('{:>9d} days  {:.3f} s/shard  online ratio {:.4f} +- {:.4f}\n'.format(
+            days, seconds, ratios['online'].mean, 1.96 * ratios['online'].stderr()))
+        if days >= maxDays or (days >= minDays and streamstats.withinPrecision(
+            list(profits.values()) + list(ratios.values()), precision)):
+          done = True
+          break
+  finally:
+    if pool is not None:
+      pool.terminate()
+  return profits, ratios, worst, shards
+
+def summarize(profits, ratios):
+  '''
+  Returns a dict mapping each strategy to its average profit, the ratio of its average profit to
+  the optimal average, the average and worst of its per-day ratios and its median ratio.
+  '''
+  results = {}
+  for name in STRATEGIES:
+    results[name] = {'avgProfit': profits[name].mean, 'avgRatio': ratios[name].mean,
+                     'worstRatio': ratios[name].max, 'medianRatio': ratios[name].quantile(0.5),
+                     'ratioOfAverages': profits[name].mean / profits['optimal'].mean}
+  return results
+
+def main():
+  numDays = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+  workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+  scenarioPath = sys.argv[3] if len(sys.argv) > 3 else None
+  results = summarize(*runMonteCarlo(numDays, workers=workers, scenarioPath=scenarioPath)[:2])
+  for name in STRATEGIES:
+    r = results[name]
+    print('{}:\t average profit {}\t average ratio {}\t worst ratio {}'.format(name, r['avgProfit'], r['ratioOfAverages'], r['worstRatio']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+# Rolling-horizon model-predictive control of the EMS battery.
+#
+# At every step the controller plans the battery over the rest of the day against forecast prices,
+# applies the first move of the plan and plans again at the next step. The plan is the dynamic
+# program of optimal.py (battery levels on a stepSize grid, optionally rate limited) run on
+# forecasts: the next price as online_better's DemandModelPredictor predicts it, and the prices
+# after it from predictPrice on predictDemand, hour by hour with the headcount held where it is.
+#
+# Re-solving the horizon at every step of every day would cost O(steps^2 x levels) per day. But
+# the forecast past the next step depends only on the step and the headcount, so the value of
+# every battery level from step t + 2 on -- the tail of the subproblem -- is solved once per
+# (t, headcount) and memoized across steps, days and batches. Each step then only adds the next
+# step's forecast and the current price on top of the cached tail, for all days and levels at once.
+#
+# Without rate limits the plan only ever fills or empties the battery depending on whether the
+# next predicted price is higher, as online_better does, up to the last step: there the plan sells
+# whatever is left, since nothing is earned after the day, where online_better holds it. So it
+# earns online_better's profit plus that last sale (2.7 a day on average, up to ~20). The
+# look-ahead pays off when the battery can only charge or discharge so much per step.
+
+import sys
+import time
+import numpy as np
+
+import online
+import optimal
+
+class MPCPolicy():
+  '''
+  Model-predictive battery control for one EnergyManagementSystem.
+
+  Parameters:
+  ems          - The EnergyManagementSystem whose predictDemand/predictPrice forecast the prices;
+                 it needs a single capacity and headcount, not one per day
+  maxCharge    - Most kWh the battery can take in per step (None for no limit)
+  maxDischarge - Most kWh the battery can give out per step (None for no limit)
+  stepSize     - Battery discretization in kWh, as in optimal.solveOptimal
+  horizon      - Steps to plan ahead (None for the rest of the day; 1 is the myopic policy)
+  '''
+  def __init__(self, ems, maxCharge=None, maxDischarge=None, stepSize=1.0, horizon=None):
+    if np.ndim(ems.B_max) or np.ndim(ems.numEmployees):
+      raise ValueError('MPCPolicy needs an EnergyManagementSystem with a single B_max and headcount')
+    self.ems = ems
+    self.numSteps = ems.tariff.numSteps
+    if maxCharge is None and maxDischarge is None and ems.B_max > 0:
+      stepSize = ems.B_max   # as in solveOptimal: only empty and full matter without limits
+    numLevels = int(round(ems.B_max / stepSize)) + 1
+    self.levels = np.arange(numLevels) * stepSize
+    self.up = numLevels if maxCharge is None else int(round(maxCharge / stepSize))
+    self.down = numLevels if maxDischarge is None else int(round(maxDischarge / stepSize))
+    self.horizon = self.numSteps if horizon is None else horizon
+    self.tails = {}   # (t, people) -> value of each battery level left after step t + 1
+    self.hits = 0
+    self.misses = 0
+
+  def bestMove(self, value, price, level):
+    '''
+    For each row, the level in reach of level (one per row, or every level when None) that
+    maximizes value - price * level. The value is concave in the level, so that is the
+    unconstrained best level clipped to the reachable range.
+    '''
+    best = np.argmax(value - price[..., None] * self.levels, axis=-1)
+    if level is None:
+      level = np.arange(len(self.levels))
+      best = best[..., None]
+    return np.clip(best, level - self.down, level + self.up)
+
+  def backup(self, value, price):
+    '''
+    One step of the dynamic program: the value of each level held into a step at price, given
+    the value of each level left after it.
+    '''
+    move = self.bestMove(value, price, None)
+    return np.take_along_axis(value, move, axis=-1) + price[..., None] * (self.levels - self.levels[move])
+
+  def forecast(self, s, people):
+    '''
+    Price forecast for step s from the headcount: the price predictPrice gives s's hour on the
+    demand predicted for it and for the hour before.
+    '''
+    start = s - s % self.ems.stepsPerHour
+    return self.ems.predictPrice(s, self.ems.predictDemand(start, people), self.ems.predictDemand(start - 1, people))
+
+  def tail(self, t, people):
+    '''
+    Value of each level left after step t + 1, one row per entry of people, from the memo.
+    '''
+    keys, inverse = np.unique(people, return_inverse=True)
+    missing = [p for p in keys.tolist() if (t, p) not in self.tails]
+    self.misses += len(missing)
+    self.hits += len(keys) - len(missing)
+    if missing:
+      missing = np.array(missing)
+      # forecast steps t + 1 .. the horizon from the headcount, then solve backward from its end
+      last = min(self.numSteps - 1, t + self.horizon)
+      value = np.zeros((len(missing), len(self.levels)))
+      for s in range(last, t + 1, -1):
+        value = self.backup(value, self.forecast(s, missing) * np.ones(len(missing)))
+      for p, row in zip(missing.tolist(), value):
+        self.tails[(t, p)] = row
+    return np.stack([self.tails[(t, p)] for p in keys.tolist()])[inverse.ravel()]
+
+  def run(self, batch, returnPlan=False):
+    '''
+    Controls the battery over every day of a DayBatch.
+
+    Return:
+    Each day's profit, as optimal.solveOptimal counts it, and with returnPlan a
+    (numDays x numSteps) array of the battery level after every step.
+    '''
+    numDays, numSteps = batch.price.shape
+    level = np.zeros(numDays, dtype=int)
+    profit = ((batch.solar - batch.demand) * batch.price).sum(axis=1)
+    plan = np.empty((numDays, numSteps))
+    predictor = online.DemandModelPredictor(self.ems)   # the next step's price, as online_better predicts it
+    for t in range(numSteps):
+      price = batch.price[:, t]
+      if t == numSteps - 1:
+        value = np.zeros((numDays, len(self.levels)))   # nothing is earned after the day
+      else:
+        value = self.tail(t, batch.people[:, t]) if t + 1 < numSteps - 1 and self.horizon > 1 \
+                else np.zeros((numDays, len(self.levels)))
+        value = self.backup(value, predictor.predict(t, batch) * np.ones(numDays))
+      move = self.bestMove(value, price, level)
+      profit += price * (self.levels[level] - self.levels[move])
+      level = move
+      plan[:, t] = self.levels[level]
+    return (profit, plan) if returnPlan else profit
+
+def main():
+  numDays = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+  batchSize = 10000
+  B_max, rate, stepSize = 180, 30, 5.0   # B_max and the limits are multiples of stepSize, so it loses nothing
+  rng = np.random.default_rng(42)
+  EMS = online.EnergyManagementSystem(B_max)
+  policies = {'myopic': MPCPolicy(EMS, rate, rate, stepSize, horizon=1), 'mpc': MPCPolicy(EMS, rate, rate, stepSize)}
+  profits = dict((name, 0.0) for name in ['optimal'] + list(policies))
+  seconds = dict((name, 0.0) for name in policies)
+  for first in range(0, numDays, batchSize):
+    batch = online.generateInputBatch(online.generateWeatherBatch(min(batchSize, numDays - first), rng), rng)
+    profits['optimal'] += optimal.solveOptimal(batch, B_max, rate, rate, stepSize).sum()
+    for name, policy in policies.items():
+      start = time.time()
+      profits[name] += policy.run(batch).sum()
+      seconds[name] += time.time() - start
+  print('{} days, B_max {} kWh, charge/discharge limit {} kWh per step'.format(numDays, B_max, rate))
+  for name, policy in policies.items():
+    print('{}:\t average profit {}\t ratio {}\t {:.2f} s\t {} subproblems solved, {} reused'.format(
+      name, profits[name] / numDays, profits[name] / profits['optimal'], seconds[name], policy.misses, policy.hits))
+
+if __name__ == '__main__':
+    main()
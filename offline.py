@@ -8,6 +8,7 @@
 # global variable: battery storage
 import numpy as np
 import math
+import streamstats
 
 NUM_EMPLOYEES = 100
 PROB_ATTEND = 0.9
@@ -17,6 +18,8 @@ PRICE_GAUSSIAN_STD = 0.005
 SOLAR_GAUSSIAN_STD = 200
 HOURS_IN_DAY = 24
 MAX_SOLAR_GEN = 9500
+PRECISION = 0.05   # relative precision main() runs to
+MIN_DAYS = 30
 
 def getRandomNoiseArray(std_scale, num_elems):
 	return np.random.normal(0, std_scale, num_elems)
@@ -68,55 +71,25 @@ class EnergyManagementSystem():
 	#fullDayDemands is an list of tuples; each tuple is an hour in 24 hour day 
 	#representing(time, demand(t), renewable(t), electricity_price(t))
 	def offlineAlgo(self, fullDayDemands):
-		def drawFromRenewable():
-			for index, t in enumerate(fullDayDemands): 
-				tList = list(t)
-				tList [1] -= tList[2]
-				t = tuple(tList)
-				fullDayDemands[index] = t
-
-
-		max_price_tuple = max(fullDayDemands, key=lambda item:item[3]) #returns tuple w highest price
-		max_price = max_price_tuple[3]
-		max_price_index = max_price_tuple[0]
-		# print("max price is {} at time {}".format(max_price, max_price_index))
-
-		min_price_tuple = min(fullDayDemands, key=lambda item:item[3]) #returns tuple w highest price
-		min_price = min_price_tuple[3]
-		min_price_index = min_price_tuple[0]
-		# print("min price is {} at time {}".format(min_price, min_price_index))
-
-		max_demand_tuple = max(fullDayDemands, key=lambda item:item[1]) #returns tuple w highest price
-		max_demand = max_price_tuple[1]
-		max_demand_index = max_demand_tuple[0] 
-		# print("max demand is {} at time {}".format(max_demand, max_demand_index))
-
-		# print("before drawing from renewable:")
-		# print("\t{}".format(fullDayDemands))
-		drawFromRenewable()
-		# print("after drawing from renewable: ")
-		# print("\t{}".format(fullDayDemands))
-		numSteps = len(fullDayDemands)
-		for index, t in enumerate(fullDayDemands):
-			# print("TIME {}: ".format(t[0]))
-			
-			tList = list(t)
-			currDemand = tList[1]
-			priceNow = tList[3]
+		# read the day as columns once; demand is first drawn from renewable generation
+		times, demands, solars, prices = zip(*fullDayDemands)
+		netDemands = [demand - solar for demand, solar in zip(demands, solars)]
+		numSteps = len(prices)
+		for index in range(numSteps):
+			currDemand = netDemands[index]
+			priceNow = prices[index]
 
 			if currDemand > 0: #still have demand to meet: go to battery
 				if self.battery_avail > 0 and self.battery_avail < currDemand: #have energy sitting in battery
-					tList[1] -= self.battery_avail
+					currDemand -= self.battery_avail
 					self.battery_avail = 0
 				if self.battery_avail > 0 and self.battery_avail >= currDemand:
-					tList[1] = 0
 					self.battery_avail -= currDemand
-			currDemand = tList[1]
+					currDemand = 0
 			if currDemand > 0: #if battery couldnt satisfy
 				self.profit -= priceNow*currDemand #buy to satisfy demand. have no excess to sell
-				tList[1] = 0
 			if index != numSteps - 1:
-				priceNext = fullDayDemands[index+1][3]
+				priceNext = prices[index+1]
 				if priceNow < priceNext: #buy energy to fill up battery 
 					self.profit -= (self.B_max - self.battery_avail)*priceNow #fill up battery, update cost
 					self.battery_avail = self.B_max
@@ -124,11 +97,6 @@ class EnergyManagementSystem():
 					if self.battery_avail > 0:
 						self.profit += priceNow*self.battery_avail
 						self.battery_avail = 0
-			fullDayDemands[index] = tuple(tList)
-			# print("\tprofit is: {}".format(self.profit))
-			# print("\tbattery capacity is: {}".format(self.battery_avail))
-		# print("after offline algo: ")
-		# print(fullDayDemands)
 		return self.profit
 		
 
@@ -139,15 +107,15 @@ def main():
 	# fullDayDemands = [(0, 5, 3, 6), (1, 6, 3, 9), (2, 4, 2, 3)]
 	
 
-	profits = []
-	for x in range(1000):
+	# run until the average is known to within PRECISION (95% confidence) instead of a fixed number of days
+	profits = streamstats.RunningStats()
+	while profits.count < MIN_DAYS or not streamstats.withinPrecision([profits], PRECISION):
 		data = generateInput()
 		EMS = EnergyManagementSystem(10000)
 		p = EMS.offlineAlgo(data)
-		profits.append(p)
+		profits.update([p])
 		print(p)
-	avgProfit = np.average(profits)
-	print("average profit {}".format(avgProfit))
+	print("average profit {} over {} days".format(profits.mean, profits.count))
 
 
 
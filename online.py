@@ -5,14 +5,20 @@
 # 4. electricity market price
 
 
+import collections
 import numpy as np
 import math
 import sys
-from matplotlib import pyplot as plt
+import time
+import optimal
+import tariff
 
 # General constants
 PRICE_GAUSSIAN_STD = 0.005
 HOURS_IN_DAY = 24
+STEPS_PER_HOUR = 1   # time resolution of main(); 12 gives 5-minute steps like the CAISO data
+PRECISION = 1e-3   # main() runs until its averages are within this fraction (95% confidence)
+TARIFF = tariff.MODEL_TARIFF   # time-of-use base prices, see tariff.py
 
 # Solar constants
 AVG_SOLAR_GEN = 250
@@ -200,14 +206,8 @@ def generatePrice(t, currDemand, prevDemand):
   '''
   Generates price
   '''
-  price = 0
-  if t >= 9 and t < 14:
-    price = 0.37729
-  elif (t >= 14 and t < 16) or (t >= 6 and t < 9):
-    price = 0.26202
-  else:
-    price = 0.18524
-  if t not in [0, 6, 9, 14, 16]:
+  price = TARIFF.price[t]
+  if not TARIFF.boundary[t]:
     if currDemand > prevDemand:
       price += math.log(currDemand - prevDemand) * 0.02
     elif currDemand < prevDemand:
@@ -229,259 +229,523 @@ def generateInput(weather):
     data.append(eachStep)
   return data
 
+# BATCH GENERATORS BELOW
+# Same distributions as generateWeather/generateInput, but every day of a batch is drawn
+# with a handful of array calls instead of one scalar draw per hour.
+
+# Per-season weather parameters, indexed winter, spring, summer, autumn
+SEASON_PARTIAL_CLOUD = np.array([0.45, 0.35, 0.2, 0.35])
+SEASON_FULL_CLOUD = np.array([0.65, 0.5, 0.25, 0.5])
+SEASON_CLOUD_MODE = np.array([0.7, 0.4, 0.1, 0.5])
+SEASON_HIGH_TEMP = np.array([[60, 25], [70, 25], [80, 36], [65, 25]])
+SEASON_LOW_TEMP = np.array([[40, 16], [45, 36], [55, 16], [43, 16]])
+SEASON_SUNRISE = np.array([[6, 2], [6, 2], [5, 2], [6, 2]])   # (earliest, number of choices)
+SEASON_SUNSET = np.array([[17, 2], [18, 3], [20, 2], [18, 3]])
+
+DayBatch = collections.namedtuple('DayBatch', ['demand', 'people', 'solar', 'price'])
+PEOPLE_DTYPE = np.int16   # headcounts up to 32767, checked by dayBatch
+
+def dayBatch(demand, people, solar, price, dtype=np.float64):
+  '''
+  Packs (numDays x numSteps) columns into a DayBatch laid out step-major (Fortran order), with
+  demand, solar and price as dtype (np.float64 or np.float32) and people as PEOPLE_DTYPE. Each
+  step's readings are then contiguous, so the simulation kernels read the batch in place instead
+  of copying it, and a day takes numSteps * (3 * itemsize + 2) bytes: 336 for an hourly day in
+  float32, against several kB as a list of (t, demand, people, solar, price) tuples. Raises
+  ValueError for headcounts PEOPLE_DTYPE cannot hold.
+  '''
+  people = np.asarray(people)
+  limits = np.iinfo(PEOPLE_DTYPE)
+  if people.size and (people.min() < limits.min or people.max() > limits.max):
+    raise ValueError('headcounts from {} to {} do not fit in {}'.format(people.min(), people.max(),
+                                                                       np.dtype(PEOPLE_DTYPE).name))
+  return DayBatch(np.asarray(demand, dtype=dtype, order='F'), np.asarray(people, dtype=PEOPLE_DTYPE, order='F'),
+                  np.asarray(solar, dtype=dtype, order='F'), np.asarray(price, dtype=dtype, order='F'))
+
+def generateWeatherBatch(numDays, rng=np.random):
+  '''
+  Generates weather for numDays days at once.
+
+  Parameters:
+  numDays - The number of days to generate
+  rng     - Source of randomness; np.random (the global state) or a np.random.Generator
+
+  Return:
+  A (numDays x 5) array whose rows are (cloudCover, highTemp, lowTemp, sunrise, sunset),
+  matching the tuple returned by generateWeather.
+  '''
+  season = (rng.random(numDays) * 4).astype(int)
+  cloudy = rng.random(numDays)
+  cloudCover = np.where(cloudy < SEASON_FULL_CLOUD[season], 1.0, 0.0)
+  partial = cloudy < SEASON_PARTIAL_CLOUD[season]
+  cloudCover[partial] = rng.triangular(0.0, SEASON_CLOUD_MODE[season[partial]], 1.0)
+
+  highTemp = rng.normal(SEASON_HIGH_TEMP[season, 0], SEASON_HIGH_TEMP[season, 1])
+  lowTemp = rng.normal(SEASON_LOW_TEMP[season, 0], SEASON_LOW_TEMP[season, 1])
+
+  sunrise = SEASON_SUNRISE[season, 0] + (rng.random(numDays) * SEASON_SUNRISE[season, 1]).astype(int)
+  sunset = SEASON_SUNSET[season, 0] + (rng.random(numDays) * SEASON_SUNSET[season, 1]).astype(int)
+  return np.stack([cloudCover, np.maximum(highTemp, lowTemp), np.minimum(highTemp, lowTemp), sunrise, sunset], axis=1)
+
+def generateInputBatch(weather, rng=np.random, stepsPerHour=1, numEmployees=None, dtype=np.float64):
+  '''
+  Batch version of generateInput: generates one day of data per row of weather.
+
+  Parameters:
+  weather      - A (numDays x 5) array from generateWeatherBatch
+  rng          - Source of randomness; np.random (the global state) or a np.random.Generator
+  stepsPerHour - Number of steps each hour is split into. Demand per step is the hourly model
+                 spread evenly over the hour (mean and variance divided by stepsPerHour); arrival
+                 and departure probabilities follow the fractional hour of each step. Every step of
+                 an hour gets the price adjustment of the hour's demand against the hour before,
+                 plus independent price noise per step. The noise variance is divided by
+                 stepsPerHour so the hour's average price, which is what an hourly step
+                 reports, keeps the PRICE_GAUSSIAN_STD noise of the hourly model.
+  numEmployees - Headcount of the building, or one per day (default NUM_EMPLOYEES)
+  dtype        - Float type of the demand, solar and price columns; np.float32 halves their memory
+
+  Return:
+  A DayBatch of (numDays x HOURS_IN_DAY * stepsPerHour) arrays, laid out as by dayBatch. Row i,
+  column t of the arrays holds the (demand, people, solar, price) entries of the tuple
+  generateInput returns for step t.
+  '''
+  numDays = len(weather)
+  numSteps = HOURS_IN_DAY * stepsPerHour
+  numAttending = rng.binomial(NUM_EMPLOYEES if numEmployees is None else numEmployees, PROB_ATTEND, numDays)
+  t = np.arange(numSteps) / stepsPerHour   # hour of day at the start of each step
+
+  # demand regimes, see generateDemand
+  low = (t >= 20) | (t < 7)
+  high = (t >= 9) & (t < 17)
+  rampUp = (t >= 7) & (t < 9)
+  rampDown = (t >= 17) & (t < 20)
+
+  # Headcount per step. Arrivals can only grow the headcount during the ramp up and
+  # departures can only shrink it during the ramp down, which is a running max/min.
+  people = np.zeros((numDays, numSteps), dtype=int)
+  people[:, high] = numAttending[:, None]
+  showedUp = rng.binomial(numAttending[:, None], PROB_EARLY * (t[rampUp] - 6))
+  people[:, rampUp] = np.maximum.accumulate(showedUp, axis=1)
+  stayedLate = rng.binomial(numAttending[:, None], PROB_STAY_LATE * (20 - t[rampDown]))
+  people[:, rampDown] = np.minimum.accumulate(np.minimum(numAttending[:, None], stayedLate), axis=1)
+  numHere = np.zeros_like(people)
+  numHere[:, 1:] = people[:, :-1]
+
+  ramp = rampUp | rampDown
+  present = np.where(high, numAttending[:, None], numHere)
+  demand = np.where(low, rng.normal(LOW_DEMAND_AVG / stepsPerHour, (LOW_DEMAND_VAR / stepsPerHour) ** 0.5, (numDays, numSteps)),
+                    rng.normal((HIGH_DEMAND_NO_PPL_AVG + present * CONSUMPTION_PER_EMPLOYEE) / stepsPerHour,
+                               ((HIGH_DEMAND_NO_PPL_VAR + present * EMPLOYEE_VAR) / stepsPerHour) ** 0.5))
+  moved = np.where(ramp, people - numHere, 0)
+  demand += np.where(ramp, rng.normal(moved * CONSUMPTION_PER_EMPLOYEE / stepsPerHour,
+                                      (np.abs(moved) * EMPLOYEE_VAR / stepsPerHour) ** 0.5) / 2, 0)
+  demand = np.maximum(0, demand)
+
+  # Prices move with the change in demand from one hour to the next, as in the hourly model, and
+  # each step of an hour gets its hour's adjustment. Taken step to step instead, the demand noise
+  # of every step would swing the price and make finer days far more profitable to trade.
+  hourly = demand.reshape(numDays, HOURS_IN_DAY, stepsPerHour).sum(axis=2)
+  prevHourly = np.zeros_like(hourly)
+  prevHourly[:, 1:] = hourly[:, :-1]
+  tou = TARIFF.atResolution(stepsPerHour)
+  change = hourly - prevHourly
+  adjust = np.sign(change) * np.log(np.abs(change), out=np.zeros_like(change), where=change != 0) * 0.02
+  adjust = np.where(tou.boundary[:numSteps:stepsPerHour], 0, adjust)
+  price = tou.price[:numSteps] + np.repeat(adjust, stepsPerHour, axis=1)
+  price = np.maximum(0, rng.normal(price, PRICE_GAUSSIAN_STD / stepsPerHour ** 0.5))
+
+  # generateSolar currently reports zero generation; mirror it so batch and per-day runs agree
+  solar = np.zeros_like(demand)
+  return dayBatch(demand, people, solar, price, dtype)
+
+def toDayList(batch, i):
+  '''
+  Returns day i of a DayBatch as the list of (t, demand, people, solar, price) tuples that
+  generateInput produces, for code that consumes single days. As there, the readings are Python
+  numbers, which the per-day strategies do arithmetic on far faster than on numpy scalars.
+  '''
+  return list(zip(range(batch.demand.shape[1]), batch.demand[i].tolist(), batch.people[i].tolist(),
+                  batch.solar[i].tolist(), batch.price[i].tolist()))
+
+
+# PRICE PREDICTORS BELOW
+# The EMS strategies only differ in how they predict the next step's price, so each strategy is
+# a predictor plugged into simulateBatch. predict(t, batch) returns the price expected at step
+# t + 1 for every day in batch, using at most the first t + 1 steps (except the offline oracle).
+# Online predictors implement predictStep, which only sees step t's readings, so they can also
+# drive a streaming controller (see controller.py).
+
+class PricePredictor():
+  # Whether the policy should skip refilling the battery at the final step
+  holdLastStep = True
+  # Whether predictions look at data past step t, which rules out running online
+  needsFuture = False
+
+  def __init__(self, ems):
+    self.ems = ems
+
+  def predict(self, t, batch):
+    return self.predictStep(t, batch.demand[:, t], batch.people[:, t], batch.solar[:, t], batch.price[:, t])
+
+  def predictDay(self, index, day):
+    '''
+    predict() for step index of a single day, given as a list of (t, demand, people, solar,
+    price) tuples.
+    '''
+    return self.predictStep(*day[index])
+
+  def predictStep(self, t, demand, people, solar, price):
+    '''
+    Predicts the price at step t + 1 from the readings at step t, given as scalars or as one
+    entry per day.
+    '''
+    raise NotImplementedError
+
+class OraclePredictor(PricePredictor):
+  '''
+  Offline: knows the true price at the next step.
+  '''
+  holdLastStep = False
+  needsFuture = True
+
+  def predict(self, t, batch):
+    if t < batch.price.shape[1] - 1:
+      return batch.price[:, t + 1]
+    return 0
+
+  def predictDay(self, index, day):
+    if index < len(day) - 1:
+      return day[index + 1][4]
+    return 0
+
+class TablePredictor(PricePredictor):
+  '''
+  Online: expects the base TOU price at the next step.
+  '''
+  def predictStep(self, t, demand, people, solar, price):
+    return self.ems.tariff.horizonPrice[t + 1]
+
+class DemandModelPredictor(PricePredictor):
+  '''
+  Online (better predictor): at the end of each hour, predicts the next hour's demand from the
+  current headcount, then its price from the predicted change against the hour's total demand,
+  as generateInputBatch prices hours. Within an hour the price keeps its hour's adjustment, so
+  the current price is the prediction. The hour's demand is summed as the steps come in, so the
+  steps of a day must be fed in order. Given a forecaster (see forecast.py), its fitted model
+  predicts the price instead of predictDemand and predictPrice; it must work at the EMS's
+  stepsPerHour.
+  '''
+  def __init__(self, ems, forecaster=None):
+    PricePredictor.__init__(self, ems)
+    if forecaster is not None and forecaster.stepsPerHour != ems.stepsPerHour:
+      raise ValueError('forecaster works at {} steps per hour, but the EMS at {}'.format(
+        forecaster.stepsPerHour, ems.stepsPerHour))
+    self.forecaster = forecaster
+    self.hourDemand = None   # demand of the current hour up to the last step seen
+
+  def predictStep(self, t, demand, people, solar, price):
+    if self.forecaster is not None:
+      return self.forecaster.forecast(t, demand, people, price)[1]
+    stepsPerHour = self.ems.stepsPerHour
+    self.hourDemand = demand if t % stepsPerHour == 0 else self.hourDemand + demand
+    if (t + 1) % stepsPerHour:
+      return price
+    return self.ems.predictPrice(t + 1, self.ems.predictDemand(t + 1, people), self.hourDemand / stepsPerHour)
+
+class RandomPredictor(PricePredictor):
+  '''
+  Online baseline: a uniformly random price prediction.
+  '''
+  def __init__(self, ems, rng=np.random):
+    PricePredictor.__init__(self, ems)
+    self.rng = rng
+
+  def predictStep(self, t, demand, people, solar, price):
+    return self.rng.random(np.shape(price) or None) * 0.45 + 0.05
+
+# Strategy name -> predictor class; each is constructed with the EnergyManagementSystem using it
+PREDICTORS = {
+  'offline': OraclePredictor,
+  'online': TablePredictor,
+  'online_better': DemandModelPredictor,
+  'random': RandomPredictor,
+}
+
+# Strategies compared in main(), in report order. Competitive ratios are taken against 'optimal'.
+STRATEGIES = ['optimal', 'offline', 'online', 'online_better', 'baseline', 'random']
+
+def stepBattery(battery, demand, solar, price, predPrice, B_max, hold=False):
+  '''
+  The EMS charge/discharge rules for one step of a single site, on scalars. Meets demand from
+  solar and the battery, stores the excess up to B_max and trades the shortfall or overflow with
+  the grid; then, if the price is predicted to decrease at the next step, sells everything, and
+  otherwise fills up (or with hold, keeps the battery as it is). simulateBatch applies the same
+  rules to arrays of days.
+
+  Return:
+  (grid, trade, target): the energy sold to the grid to meet demand and the energy sold by the
+  decision (both negative when buying), and the battery level held until the next step.
+  '''
+  excess = solar + battery - demand
+  # branches rather than min/max, which are several times slower on numpy scalars
+  if excess < 0:
+    battery = 0.0
+  elif excess > B_max:
+    battery = B_max
+  else:
+    battery = excess
+  if price > predPrice:
+    target = 0.0
+  elif hold:
+    target = battery
+  else:
+    target = B_max
+  return excess - battery, battery - target, target
+
+def settleBatch(battery, demand, solar, B_max, out=None):
+  '''
+  The first half of stepBattery on arrays: meets each day's demand from solar and the battery and
+  stores the excess up to B_max.
+
+  Return:
+  (battery, grid): the battery levels after storing the excess, and the energy sold to the grid
+  (negative when buying), written to out if given.
+  '''
+  excess = np.add(solar, battery, out=out)
+  excess -= demand
+  battery = np.clip(excess, 0, B_max)
+  excess -= battery
+  return battery, excess
+
+def simulateBatch(batch, B_max, predictor):
+  '''
+  Runs the EMS battery policy over every day of a batch at once. Each step applies the
+  charge/discharge rules as an array update across all days; every EnergyManagementSystem
+  strategy is this kernel with a different predictor.
+
+  Parameters:
+  batch     - A DayBatch of (numDays x numSteps) arrays
+  B_max     - Battery capacity in kWh, or an array of capacities broadcasting against the days,
+              e.g. shape (numCapacities, 1) to run several capacities over the same days at once
+  predictor - A PricePredictor giving the predicted price at the next step
+
+  Return:
+  An array holding the profit of each day, with B_max's leading dimensions if it is an array.
+  '''
+  numDays, numSteps = batch.demand.shape
+  # one row per step (see dayBatch)
+  demands, solars, prices = [np.ascontiguousarray(np.transpose(column))
+                             for column in (batch.demand, batch.solar, batch.price)]
+  shape = np.broadcast(np.asarray(B_max), demands[0]).shape
+  dtype = np.result_type(demands, B_max)   # float32 batches are simulated in float32
+  battery = np.zeros(shape, dtype)
+  profit = np.zeros(shape, dtype)
+  grid = np.empty(shape, dtype)
+  trade = np.empty(shape, dtype)
+  for t in range(numSteps):
+    price = prices[t]
+    predPrice = predictor.predict(t, batch)
+
+    # the rules of stepBattery, across all days
+    battery, grid = settleBatch(battery, demands[t], solars[t], B_max, grid)
+    grid *= price
+    profit += grid
+    if predictor.holdLastStep and t == numSteps - 1:
+      target = np.where(price > predPrice, 0, battery)
+    else:
+      target = np.where(price > predPrice, 0, B_max)
+    np.subtract(battery, target, out=trade)
+    trade *= price
+    profit += trade
+    battery = target
+  return profit
 
 
 class EnergyManagementSystem():
-  def __init__(self, B_max):
+  def __init__(self, B_max, stepsPerHour=1, numEmployees=None, tariff=None):
     self.B_max = B_max
+    self.stepsPerHour = stepsPerHour   # days are HOURS_IN_DAY * stepsPerHour steps long
+    self.numEmployees = numEmployees   # None for NUM_EMPLOYEES, or an array with one per day
     self.battery_avail = 0
     self.profit = 0
-    self.priceTable = {}
-    for t in range(9, 14):
-      self.priceTable[t] = 0.37729
-    for t in range(6, 9):
-      self.priceTable[t] = 0.26202
-    for t in range(14, 16):
-      self.priceTable[t] = 0.26202
-    for t in range(0, 6):
-      self.priceTable[t] = 0.18524
-    for t in range(16, 24):
-      self.priceTable[t] = 0.18524
-    self.priceTable[24] = 0
+    # base prices the predictors expect (default the synthetic TARIFF); shared and read-only
+    self.tariff = (TARIFF if tariff is None else tariff).atResolution(stepsPerHour)
   
   # PREDICTION FUNCTIONS BELOW
 
   def predictDemand(self, t, people):
-    if t >= 20 or t < 7:
+    '''
+    Predicts the demand at step t from the headcount at the previous step, using the hourly
+    prediction of t's hour spread evenly over the hour's steps.
+    '''
+    hour = t // self.stepsPerHour
+    if hour >= 20 or hour < 7:
       demand = LOW_DEMAND_AVG
-    elif t == 9:
+    elif hour == 9:
       demand = HIGH_DEMAND_NO_PPL_AVG + people / 0.6 * CONSUMPTION_PER_EMPLOYEE
-    elif t > 9 and t < 17:
+    elif hour > 9 and hour < 17:
       demand = HIGH_DEMAND_NO_PPL_AVG + people * CONSUMPTION_PER_EMPLOYEE
-    elif t == 7:
-      demand = HIGH_DEMAND_NO_PPL_AVG + NUM_EMPLOYEES * PROB_ATTEND * CONSUMPTION_PER_EMPLOYEE * PROB_EARLY
-    elif t == 8:
+    elif hour == 7:
+      numEmployees = NUM_EMPLOYEES if self.numEmployees is None else self.numEmployees
+      demand = HIGH_DEMAND_NO_PPL_AVG + numEmployees * PROB_ATTEND * CONSUMPTION_PER_EMPLOYEE * PROB_EARLY
+    elif hour == 8:
       demand = HIGH_DEMAND_NO_PPL_AVG + people * 2 * CONSUMPTION_PER_EMPLOYEE
-    elif t == 17:
+    elif hour == 17:
       demand = HIGH_DEMAND_NO_PPL_AVG + people * PROB_STAY_LATE * 3 * CONSUMPTION_PER_EMPLOYEE
-    elif t == 18:
+    elif hour == 18:
       demand = HIGH_DEMAND_NO_PPL_AVG + people * 2 / 3 * CONSUMPTION_PER_EMPLOYEE
-    elif t == 19:
+    elif hour == 19:
       demand = HIGH_DEMAND_NO_PPL_AVG + people * 1 / 2 * CONSUMPTION_PER_EMPLOYEE
-    return max(0, demand)
+    return (np.maximum(0, demand) if isinstance(demand, np.ndarray) else max(0, demand)) / self.stepsPerHour
 
   def predictPrice(self, t, predDemand, currDemand):
-    price = 0
-    if t >= 9 and t < 14:
-      price = 0.37729
-    elif (t >= 14 and t < 16) or (t >= 6 and t < 9):
-      price = 0.26202
-    else:
-      price = 0.18524
-    if t not in [0, 6, 9, 14, 16]:
-      if predDemand > currDemand:
-        price += math.log(predDemand - currDemand) * 0.02
-      elif currDemand > predDemand:
-        price -= math.log(currDemand - predDemand) * 0.02
-    return max(0, price)
+    '''
+    Predicts the price at step t from the demand per step predicted for t's hour and the demand
+    per step of the hour before. As in generateInputBatch, the adjustment follows the change in
+    the hours' total demand and is the same for every step of an hour.
+    '''
+    price = self.tariff.price[t]
+    if not self.tariff.boundary[t - t % self.stepsPerHour]:
+      change = (predDemand - currDemand) * self.stepsPerHour
+      if not isinstance(change, np.ndarray):
+        # a single day's readings, as the per-day strategies pass them, stay off numpy's array calls
+        if change > 0:
+          price += math.log(change) * 0.02
+        elif change < 0:
+          price -= math.log(-change) * 0.02
+      else:
+        # one entry per day; no adjustment when the demands are equal
+        with np.errstate(divide='ignore', invalid='ignore'):
+          price = price + np.where(change != 0, np.sign(change) * np.log(np.abs(change)), 0) * 0.02
+    return np.maximum(0, price) if isinstance(price, np.ndarray) else max(0, price)
 
   # OFFLINE ALGORITHM BELOW
 
   def offlineAlgo(self, fullDayDemands):
     '''
     fullDayDemands is an list of tuples; each tuple is an hour in 24 hour day 
-    representing(time, demand(t), renewable(t), electricity_price(t))
+    representing(time, demand(t), people(t), renewable(t), electricity_price(t))
     '''
-    self.battery_avail = 0
-    self.profit = 0
-    numSteps = len(fullDayDemands)
-    for index in range(numSteps):
-      t, demand, people, solar, price = fullDayDemands[index]
-      if index < numSteps - 1:
-        predPrice = fullDayDemands[index + 1][4]
-      else:
-        predPrice = 0
-
-      if demand > solar + self.battery_avail:
-        # not enough energy to meet demand
-        self.profit -= (demand - (solar + self.battery_avail)) * price
-        self.battery_avail = 0
-      elif demand <= solar + self.battery_avail:
-        # generate excess energy
-        self.battery_avail = solar + self.battery_avail - demand
-        if self.battery_avail > self.B_max:
-          self.profit += (self.battery_avail - self.B_max) * price
-          self.battery_avail = self.B_max
-
-      if price > predPrice:
-        # price predicted to decrease at next timestep
-        if self.battery_avail > 0:
-          self.profit += self.battery_avail * price
-          self.battery_avail = 0
-      else:
-        # price predicted to increase at next timestep
-        self.profit -= (self.B_max - self.battery_avail) * price
-        self.battery_avail = self.B_max
-    return self.profit
+    return self.simulate(fullDayDemands, OraclePredictor(self))
 
   # ONLINE ALGORITHMS BELOW
 
   def onlineAlgo(self, fullDayDemands):
-    self.battery_avail = 0
-    self.profit = 0
-    numSteps = len(fullDayDemands)
-    for index in range(numSteps):
-      t, demand, people, solar, price = fullDayDemands[index]
-      predPrice = self.priceTable[t + 1]
-      if demand > solar + self.battery_avail:
-        # not enough energy to meet demand
-        self.profit -= (demand - (solar + self.battery_avail)) * price
-        self.battery_avail = 0
-      elif demand <= solar + self.battery_avail:
-        # generate excess energy
-        self.battery_avail = solar + self.battery_avail - demand
-        if self.battery_avail > self.B_max:
-          self.profit += (self.battery_avail - self.B_max) * price
-          self.battery_avail = self.B_max
-
-      if price > predPrice:
-        # price predicted to decrease at next timestep
-        if self.battery_avail > 0:
-          self.profit += self.battery_avail * price
-          self.battery_avail = 0
-      else:
-        # price predicted to increase at next timestep
-        if t != numSteps - 1:
-          self.profit -= (self.B_max - self.battery_avail) * price
-          self.battery_avail = self.B_max
-    return self.profit
+    return self.simulate(fullDayDemands, TablePredictor(self))
 
-  def onlineAlgoBetter(self, fullDayDemands):
-    self.battery_avail = 0
-    self.profit = 0
-    numSteps = len(fullDayDemands)
-    for index in range(numSteps):
-      t, demand, people, solar, price = fullDayDemands[index]
-      predPrice = self.predictPrice(t + 1, self.predictDemand(t + 1, people), demand) # need to write these functions
-      if demand > solar + self.battery_avail:
-        # not enough energy to meet demand
-        self.profit -= (demand - (solar + self.battery_avail)) * price
-        self.battery_avail = 0
-      elif demand <= solar + self.battery_avail:
-        # generate excess energy
-        self.battery_avail = solar + self.battery_avail - demand
-        if self.battery_avail > self.B_max:
-          self.profit += (self.battery_avail - self.B_max) * price
-          self.battery_avail = self.B_max
-
-      if price > predPrice:
-        # price predicted to decrease at next timestep
-        if self.battery_avail > 0:
-          self.profit += self.battery_avail * price
-          self.battery_avail = 0
-      else:
-        # price predicted to increase at next timestep
-        if t != numSteps - 1:
-          self.profit -= (self.B_max - self.battery_avail) * price
-          self.battery_avail = self.B_max
-    return self.profit
+  def onlineAlgoBetter(self, fullDayDemands, forecaster=None):
+    return self.simulate(fullDayDemands, DemandModelPredictor(self, forecaster))
 
   # Online baseline -- random price predictor
   def onlineAlgoRandom(self, fullDayDemands):
-    self.battery_avail = 0
-    self.profit = 0
-    numSteps = len(fullDayDemands)
-    for index in range(numSteps):
-      t, demand, people, solar, price = fullDayDemands[index]
-      predPrice = np.random.random_sample() * 0.45 + 0.05
-      if demand > solar + self.battery_avail:
-        # not enough energy to meet demand
-        self.profit -= (demand - (solar + self.battery_avail)) * price
-        self.battery_avail = 0
-      elif demand <= solar + self.battery_avail:
-        # generate excess energy
-        self.battery_avail = solar + self.battery_avail - demand
-        if self.battery_avail > self.B_max:
-          self.profit += (self.battery_avail - self.B_max) * price
-          self.battery_avail = self.B_max
-
-      if price > predPrice:
-        # price predicted to decrease at next timestep
-        if self.battery_avail > 0:
-          self.profit += self.battery_avail * price
-          self.battery_avail = 0
-      else:
-        # price predicted to increase at next timestep
-        if t != numSteps - 1:
-          self.profit -= (self.B_max - self.battery_avail) * price
-          self.battery_avail = self.B_max
-    return self.profit
+    return self.simulate(fullDayDemands, RandomPredictor(self))
+
   # Greedy baseline
   def baseline(self, fullDayDemands):
-    self.battery_avail = 0
-    self.profit = 0 
-    numSteps = len(fullDayDemands)
-    for index in range(numSteps):
-      t, demand, people, solar, price = fullDayDemands[index]
+    self.profit = 0
+    for t, demand, people, solar, price in fullDayDemands:
       self.profit += (solar - demand) * price
     return self.profit
 
+  def simulate(self, fullDayDemands, predictor):
+    '''
+    Runs the battery policy driven by predictor over a single day, one stepBattery call per step
+    (as controller.Controller.step does). A day run through simulateBatch as a one-day batch
+    would spend nearly all its time on array overhead.
+    '''
+    B_max = self.B_max
+    predictDay = predictor.predictDay
+    last = len(fullDayDemands) - 1 if predictor.holdLastStep else None   # step that holds the battery
+    battery = 0.0
+    profit = 0.0
+    for index, (t, demand, people, solar, price) in enumerate(fullDayDemands):
+      predPrice = predictDay(index, fullDayDemands)
+      grid, trade, battery = stepBattery(battery, demand, solar, price, predPrice, B_max, index == last)
+      profit += grid * price
+      profit += trade * price
+    self.profit = profit
+    return self.profit
+
+  # BATCH VERSIONS BELOW
+  # Each takes a DayBatch and returns one profit per day, matching the per-day method above.
+
+  def offlineAlgoBatch(self, batch):
+    return simulateBatch(batch, self.B_max, OraclePredictor(self))
+
+  def onlineAlgoBatch(self, batch):
+    return simulateBatch(batch, self.B_max, TablePredictor(self))
+
+  def onlineAlgoBetterBatch(self, batch, forecaster=None):
+    return simulateBatch(batch, self.B_max, DemandModelPredictor(self, forecaster))
+
+  def onlineAlgoRandomBatch(self, batch, rng=np.random):
+    return simulateBatch(batch, self.B_max, RandomPredictor(self, rng))
+
+  def baselineBatch(self, batch):
+    profit = np.zeros(batch.price.shape[0])
+    for t in range(batch.price.shape[1]):
+      profit += (batch.solar[:, t] - batch.demand[:, t]) * batch.price[:, t]
+    return profit
+
+  def optimalBatch(self, batch):
+    '''
+    Exact full-horizon offline optimum (see optimal.solveOptimal), the benchmark for the
+    competitive ratios.
+    '''
+    return optimal.solveOptimal(batch, self.B_max)
+
+  def strategyBatch(self, name, batch, **kwargs):
+    '''
+    Runs the strategy registered under name in PREDICTORS over a DayBatch.
+    '''
+    return simulateBatch(batch, self.B_max, PREDICTORS[name](self, **kwargs))
+
+  def compareBatch(self, batch, rng=np.random, strategies=STRATEGIES):
+    '''
+    Returns a dict mapping each name in strategies (default STRATEGIES) to its per-day profits on batch.
+    '''
+    profits = {}
+    for name in strategies:
+      if name == 'optimal':
+        profits[name] = self.optimalBatch(batch)
+      elif name == 'baseline':
+        profits[name] = self.baselineBatch(batch)
+      elif name == 'random':
+        profits[name] = self.strategyBatch(name, batch, rng=rng)
+      else:
+        profits[name] = self.strategyBatch(name, batch)
+    return profits
 
 
 def main():
-  np.random.seed(42)
-  offline_profits = []
-  online_profits = []
-  online_better_profits = []
-  baseline_profits = []
-  random_profits = []
-  online_ratios = []
-  online_better_ratios = []
-  baseline_ratios = []
-  random_ratios = []
-  data_list = []
-  for x in range(100000):
-    weather = generateWeather()
-    data = generateInput(weather)
-    data_list.append(data)
-    EMS = EnergyManagementSystem(180)
-    offline = EMS.offlineAlgo(data)
-    online = EMS.onlineAlgo(data)
-    online_better = EMS.onlineAlgoBetter(data)
-    baseline = EMS.baseline(data)
-    random = EMS.onlineAlgoRandom(data)
-    offline_profits.append(offline)
-    online_profits.append(online)
-    online_better_profits.append(online_better)
-    baseline_profits.append(baseline)
-    random_profits.append(random)
-    online_ratios.append(online / offline)
-    online_better_ratios.append(online_better / offline)
-    baseline_ratios.append(baseline / offline)
-    random_ratios.append(random / offline)
-  avgOfflineProfit = np.average(offline_profits)
-  avgOnlineProfit = np.average(online_profits)
-  avgOnlineBetterProfit = np.average(online_better_profits)
-  avgBaselineProfit = np.average(baseline_profits)
-  avgRandomProfit = np.average(random_profits)
-  avgOnlineRatio = avgOnlineProfit / avgOfflineProfit
-  avgOnlineBetterRatio = avgOnlineBetterProfit / avgOfflineProfit
-  avgBaselineRatio = avgBaselineProfit / avgOfflineProfit
-  avgRandomRatio = avgRandomProfit / avgOfflineProfit
+  import montecarlo   # imports this module, so only import it once it is loaded
+  EMS = EnergyManagementSystem(180, STEPS_PER_HOUR)
+  # simulate until every average is known to within PRECISION, keeping the day with the worst
+  # online ratio for plotting
+  start = time.time()
+  profits, ratios, worst, shards = montecarlo.runUntil(PRECISION, 180, worstK=1, stepsPerHour=STEPS_PER_HOUR)
+  print('Simulated {} days in {:.2f} s ({:.3f} s per batch of {})'.format(
+    shards[-1][0], time.time() - start, np.mean([seconds for days, seconds in shards]), montecarlo.ADAPTIVE_SHARD_SIZE))
+  avgOptimalProfit = profits['optimal'].mean
+  avgOfflineProfit = profits['offline'].mean
+  avgOnlineProfit = profits['online'].mean
+  avgOnlineBetterProfit = profits['online_better'].mean
+  avgBaselineProfit = profits['baseline'].mean
+  avgRandomProfit = profits['random'].mean
+  avgOnlineRatio = avgOnlineProfit / avgOptimalProfit
+  avgOnlineBetterRatio = avgOnlineBetterProfit / avgOptimalProfit
+  avgBaselineRatio = avgBaselineProfit / avgOptimalProfit
+  avgRandomRatio = avgRandomProfit / avgOptimalProfit
+  print('Average optimal profit:\t {}'.format(avgOptimalProfit))
   print('Average offline profit:\t {}\nAverage online profit:\t {}\nAverage online (better predictor) profit:\t {}\nAverage baseline profit: {}\nAverage random profit:\t {}'.format(avgOfflineProfit, avgOnlineProfit, avgOnlineBetterProfit, avgBaselineProfit, avgRandomProfit))
-  print('Worst online ratio:\t {}\nAverage online ratio:\t {}'.format(max(online_ratios), avgOnlineRatio))
-  print('Worst online (better predictor) ratio:\t {}\nAverage online (better predictor) ratio:\t {}'.format(max(online_better_ratios), avgOnlineBetterRatio))
-  print('Worst baseline ratio:\t {}\nAverage baseline ratio:\t {}'.format(max(baseline_ratios), avgBaselineRatio))
-  print('Worst random ratio:\t {}\nAverage random ratio:\t {}'.format(max(random_ratios), avgRandomRatio))
-  i = online_ratios.index(max(online_ratios))
-  worst_case = data_list[i] # (t, demand, solar, price)
-  worst_demand = []
-  worst_solar = []
-  worst_price = []
-  for d in worst_case:
-    worst_demand.append(d[1])
-    worst_solar.append(d[3])
-    worst_price.append(d[4])
+  print('Worst online ratio:\t {}\nAverage online ratio:\t {}'.format(ratios['online'].max, avgOnlineRatio))
+  print('Worst online (better predictor) ratio:\t {}\nAverage online (better predictor) ratio:\t {}'.format(ratios['online_better'].max, avgOnlineBetterRatio))
+  print('Worst baseline ratio:\t {}\nAverage baseline ratio:\t {}'.format(ratios['baseline'].max, avgBaselineRatio))
+  print('Worst random ratio:\t {}\nAverage random ratio:\t {}'.format(ratios['random'].max, avgRandomRatio))
+  worst_demand = worst.days.demand[0]
+  worst_solar = worst.days.solar[0]
+  worst_price = worst.days.price[0]
+  from matplotlib import pyplot as plt   # only needed for the plot, so the module imports headless
   plt.figure()
   plt.subplot(211)
   plt.title('Worst Case Data')
@@ -495,7 +759,7 @@ def main():
   plt.xlabel('Timestep')
   plt.legend()
   plt.show()
-  print(offline_profits[i], online_profits[i])
+  print(EMS.optimalBatch(worst.days)[0], EMS.onlineAlgoBatch(worst.days)[0])
 
 
 if __name__ == '__main__':
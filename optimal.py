@@ -0,0 +1,60 @@
+# Exact offline optimum of the EMS battery problem, by dynamic programming over the battery level.
+#
+# Each step the grid covers demand - solar plus whatever goes into the battery, at the market price:
+#   profit = sum_t price_t * (solar_t - demand_t + b_{t-1} - b_t),  0 <= b_t <= B_max,  b_{-1} = 0
+# optionally with b_t - b_{t-1} <= maxCharge and b_{t-1} - b_t <= maxDischarge. Without rate limits
+# the best plan fills the battery whenever the next price is higher and empties it otherwise, which
+# is exactly what EnergyManagementSystem.offlineAlgo does; with limits the greedy is no longer optimal.
+
+import numpy as np
+
+def solveOptimal(batch, B_max, maxCharge=None, maxDischarge=None, stepSize=1.0, returnPlan=False):
+  '''
+  Solves the full-horizon offline problem for every day of a batch at once.
+
+  The value of holding b kWh is concave in b, so the best next level within the rate limits is the
+  unconstrained best level clipped to the reachable range; each step costs O(numDays x levels).
+
+  Parameters:
+  batch        - A DayBatch of (numDays x numSteps) arrays
+  B_max        - Battery capacity in kWh
+  maxCharge    - Most kWh the battery can take in per step (None for no limit)
+  maxDischarge - Most kWh the battery can give out per step (None for no limit)
+  stepSize     - Battery discretization in kWh; B_max and the rate limits should be multiples of it.
+                 Ignored without rate limits, where the solution is exact on the {0, B_max} grid.
+  returnPlan   - Also return the optimal battery level after every step
+
+  Return:
+  An array holding the optimal profit of each day, and with returnPlan a (numDays x numSteps)
+  array of battery levels.
+  '''
+  numDays, numSteps = batch.price.shape
+  if maxCharge is None and maxDischarge is None and B_max > 0:
+    # without rate limits the value is linear in the level, so only empty and full matter
+    stepSize = B_max
+  numLevels = int(round(B_max / stepSize)) + 1
+  levels = np.arange(numLevels) * stepSize
+  up = numLevels if maxCharge is None else int(round(maxCharge / stepSize))
+  down = numLevels if maxDischarge is None else int(round(maxDischarge / stepSize))
+  index = np.arange(numLevels)[None, :]
+
+  # backward pass; best[t] is the unconstrained best level to leave step t with
+  value = np.zeros((numDays, numLevels))
+  best = np.empty((numSteps, numDays), dtype=int)
+  for t in range(numSteps - 1, -1, -1):
+    price = batch.price[:, t][:, None]
+    gain = value - price * levels
+    best[t] = np.argmax(gain, axis=1)
+    nextLevel = np.clip(best[t][:, None], index - down, index + up)
+    value = np.take_along_axis(gain, nextLevel, axis=1) + price * levels
+
+  profit = value[:, 0] + ((batch.solar - batch.demand) * batch.price).sum(axis=1)
+  if not returnPlan:
+    return profit
+
+  plan = np.empty((numDays, numSteps))
+  level = np.zeros(numDays, dtype=int)
+  for t in range(numSteps):
+    level = np.clip(best[t], level - down, level + up)
+    plan[:, t] = levels[level]
+  return profit, plan
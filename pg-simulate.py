@@ -1,33 +1,14 @@
-import matplotlib.pyplot as plt
-import networkx as nx
-
-# vertex: tuple of (name of unit, generation=+1/consumption=-1)
-
-W = ("WindFarm", 1)
-S = ("SolarFarm", 1)
-D = ("Neighborhood", -1)
-B = ("Battery", 1)
-P = ("PowerPlant", 1)
+import gridflow
 
 def main():
   constructSimpleGrid()
 
 def constructSimpleGrid():
-	G = nx.MultiDiGraph()
-	G.add_node(W)
-	G.add_node(S)
-	G.add_node(D)
-	G.add_node(B)
-	G.add_node(P)
-
-
-
+	# imported here so loading this file stays cheap on headless machines
+	import matplotlib.pyplot as plt
+	import networkx as nx
 
-	G.add_edge(W, B, weight=3)
-	G.add_edge(S, B, weight=4)
-	G.add_edge(S, D, weight=6)
-	G.add_edge(W, D, weight=5)
-	G.add_edge(B, D, weight=3)
+	G = gridflow.simpleGrid()
 
 	for u, v, keys, weight in G.edges(data='weight', keys=True):
 		if weight is not None:
@@ -0,0 +1,124 @@
+# Historical replay: drives the EMS strategies with real CAISO days from data/ instead of synthetic ones.
+#
+# CAISO reports system-wide load and solar in MW every 5 minutes. They are scaled down to the size of
+# the building in online.py and turned into kWh per step, either hourly (the model's native step) or
+# at the CAISO 5-minute resolution. Prices follow the PG&E E-6 time-of-use schedule for each date,
+# and so do the price predictions of the EMS running the day (compareDays).
+# Days are read lazily from the memory-mapped caiso cache, a batch at a time.
+
+import datetime
+import sys
+import numpy as np
+
+import caiso
+import online
+import tariff
+
+DEMAND_SERIES = ('demand', 'Demand (5 min. avg.)')
+SOLAR_SERIES = ('renewables', 'Solar')
+DEMAND_SCALE = 0.006   # building kW per CAISO MW: the ~22.7 GW CAISO average maps to ~136 kW
+SOLAR_SCALE = online.AVG_SOLAR_GEN / 10000.0   # the ~10 GW CAISO solar peak maps to AVG_SOLAR_GEN
+
+def expectedPeople(stepMinutes=60):
+  '''
+  Expected headcount at every step of a day under the attendance model in online.generateDemand,
+  used in place of the unobserved headcount.
+  '''
+  attending = online.NUM_EMPLOYEES * online.PROB_ATTEND
+  hourly = np.zeros(24)
+  hourly[7:9] = attending * online.PROB_EARLY * np.arange(1, 3)
+  hourly[9:17] = attending
+  hourly[17:20] = attending * online.PROB_STAY_LATE * np.arange(3, 0, -1)
+  return np.repeat(np.round(hourly).astype(int), 60 // stepMinutes)
+
+def toSteps(values, stepMinutes):
+  '''
+  Converts (days x 288) 5-minute MW readings into MWh per step. Scaled by DEMAND_SCALE or
+  SOLAR_SCALE, this becomes the building's kWh per step.
+  '''
+  perStep = stepMinutes // caiso.STEP_MINUTES
+  power = np.asarray(values, dtype=float).reshape(len(values), -1, perStep).mean(axis=2)
+  return power * stepMinutes / 60.0
+
+def replayBatches(start=None, end=None, stepMinutes=60, batchSize=32, dataDir=caiso.DATA_DIR):
+  '''
+  Yields real days between start and end (inclusive) in batches.
+
+  Parameters:
+  start, end  - Date range (datetime.date, 'YYYY-MM-DD' or None for unbounded)
+  stepMinutes - Step length: 60 for the model's hourly steps, 5 for the native CAISO resolution,
+                or anything in between that divides an hour into whole CAISO intervals
+  batchSize   - Days per yielded batch
+
+  Return:
+  A generator of (dates, DayBatch) pairs. Days missing either series, or with a gap in one, are skipped.
+  '''
+  demandDates, demand = caiso.loadSeries(DEMAND_SERIES[0], DEMAND_SERIES[1], start, end, dataDir)
+  solarDates, solar = caiso.loadSeries(SOLAR_SERIES[0], SOLAR_SERIES[1], start, end, dataDir)
+  dates, demandIndex, solarIndex = np.intersect1d(demandDates, solarDates, return_indices=True)
+  rates = tariff.loadRates('E-6')
+  people = expectedPeople(stepMinutes)
+  for first in range(0, len(dates), batchSize):
+    chunk = slice(first, first + batchSize)
+    dayDemand = toSteps(demand[demandIndex[chunk]], stepMinutes) * DEMAND_SCALE
+    daySolar = toSteps(solar[solarIndex[chunk]], stepMinutes) * SOLAR_SCALE
+    complete = ~(np.isnan(dayDemand).any(axis=1) | np.isnan(daySolar).any(axis=1))
+    chunkDates = [d.astype(datetime.date) for d in dates[chunk][complete]]
+    if not chunkDates:
+      continue
+    price = np.array([tariff.e6Prices(d, rates, stepMinutes) for d in chunkDates])
+    yield chunkDates, online.dayBatch(dayDemand[complete], np.tile(people, (len(chunkDates), 1)),
+                                      daySolar[complete], price)
+
+def compareDays(dates, batch, B_max=180, stepsPerHour=1, rates=None, rng=np.random, strategies=online.STRATEGIES):
+  '''
+  EnergyManagementSystem.compareBatch over a batch of replayed days, each run by an EMS on the E-6
+  tariff in effect on its date. Days on the same schedule (season and day type) run together.
+
+  Parameters:
+  dates, batch - A pair yielded by replayBatches
+  rates        - Energy charges from tariff.loadRates('E-6'); read from the workbook if None
+
+  Return:
+  A dict mapping each strategy to its per-day profits, in the order of dates.
+  '''
+  rates = tariff.loadRates('E-6') if rates is None else rates
+  schedules = [tariff.e6Schedule(date) for date in dates]
+  profits = dict((name, np.empty(len(dates))) for name in strategies)
+  for schedule in sorted(set(schedules)):
+    index = np.array([i for i, s in enumerate(schedules) if s == schedule])
+    dayTariff = tariff.e6Tariff(dates[index[0]], rates, stepsPerHour)
+    EMS = online.EnergyManagementSystem(B_max, stepsPerHour, tariff=dayTariff)
+    days = online.dayBatch(*[column[index] for column in batch], dtype=batch.demand.dtype)
+    for name, dayProfits in EMS.compareBatch(days, rng, strategies).items():
+      profits[name][index] = dayProfits
+  return profits
+
+def replayDays(start=None, end=None, stepMinutes=60, dataDir=caiso.DATA_DIR):
+  '''
+  Yields (date, day) pairs, where day is the list of (t, demand, people, solar, price) tuples
+  the per-day EnergyManagementSystem algorithms take.
+  '''
+  for dates, batch in replayBatches(start, end, stepMinutes, dataDir=dataDir):
+    for i, date in enumerate(dates):
+      yield date, online.toDayList(batch, i)
+
+def main():
+  stepMinutes = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+  np.random.seed(42)
+  rates = tariff.loadRates('E-6')
+  print('date\t\t' + '\t'.join(online.STRATEGIES))
+  totals = dict((name, 0.0) for name in online.STRATEGIES)
+  numDays = 0
+  for dates, batch in replayBatches(stepMinutes=stepMinutes):
+    profits = compareDays(dates, batch, 180, 60 // stepMinutes, rates)
+    for i, date in enumerate(dates):
+      print('{}\t'.format(date) + '\t'.join('{:.2f}'.format(profits[name][i]) for name in online.STRATEGIES))
+    for name in online.STRATEGIES:
+      totals[name] += profits[name].sum()
+    numDays += len(dates)
+  print('average\t\t' + '\t'.join('{:.2f}'.format(totals[name] / numDays) for name in online.STRATEGIES))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+# Reinforcement learning on the EMS battery problem.
+#
+# BatteryEnv wraps the battery dynamics of simulateBatch (online.py) in a Gym-style reset()/step()
+# interface over many environments at once: each environment plays one simulated day, and all of
+# them advance together, one vectorized update per step. Instead of predicting the price, an agent
+# picks the battery level directly: sell (empty it), hold, or fill it up.
+#
+# QLearner learns a tabular policy over a discretized state -- step of the day, battery level,
+# predicted change in demand and price relative to the tariff. Since the step of the day is part
+# of the state, the problem has a finite horizon, so each batch of simulated days is swept backward
+# in time and every visited (state, action) entry is updated to the running average of reward plus
+# the value of the next state (fitted value iteration on a table). The learned policy is exported as a lookup table
+# of actions, which evaluates as fast as the heuristic strategies.
+
+import sys
+import time
+import numpy as np
+
+import online
+
+ACTIONS = ('sell', 'hold', 'fill')
+SELL, HOLD, FILL = range(len(ACTIONS))
+
+# State discretization: price minus the tariff price ($/kWh), and the change in demand to the next
+# step predicted from the headcount by EnergyManagementSystem.predictDemand (kWh per hour)
+PRICE_EDGES = np.array([-0.08, -0.04, -0.02, 0, 0.02, 0.04, 0.08])
+CHANGE_EDGES = np.array([-30, -15, -5, 0, 5, 15, 30])
+BATTERY_BINS = 8
+
+class BatteryEnv():
+  '''
+  numEnvs simulated days stepped together. Observations are (numEnvs x 5) arrays of
+  (t, battery, demand, people, price): step t's readings, and the battery left after step t's
+  demand has been met. Actions hold one of SELL, HOLD or FILL per environment.
+
+  Rewards are profits over the baseline of buying all demand from the grid: the value, at the
+  step's price, of the energy the battery gives out less the energy put in, through an action and
+  through meeting the next step's demand. This leaves out the cost of the demand itself, which no
+  action changes, so returns are far less noisy. All days end together after the last step, when
+  the environments reset to new days unless autoReset is False.
+  '''
+  def __init__(self, numEnvs, B_max=180, stepsPerHour=1, rng=np.random, autoReset=True):
+    self.numEnvs = numEnvs
+    self.B_max = B_max
+    self.stepsPerHour = stepsPerHour
+    self.numSteps = online.HOURS_IN_DAY * stepsPerHour
+    self.rng = rng
+    self.autoReset = autoReset
+
+  def reset(self, batch=None):
+    '''
+    Starts new days: the days of batch (a DayBatch with numEnvs rows), or freshly generated ones.
+
+    Return:
+    The first observation.
+    '''
+    if batch is None:
+      weather = online.generateWeatherBatch(self.numEnvs, self.rng)
+      batch = online.generateInputBatch(weather, self.rng, self.stepsPerHour)
+    self.batch = batch
+    # one row per step (see online.dayBatch)
+    self.demands, self.people, self.solars, self.prices = [np.ascontiguousarray(np.transpose(column))
+                                                           for column in batch]
+    self.t = 0
+    self.battery = np.zeros(self.numEnvs)
+    self.profit = np.zeros(self.numEnvs)
+    self.settle()
+    return self.observe()
+
+  def settle(self):
+    '''
+    Meets step t's demand from solar and the battery (see online.settleBatch). Returns the value
+    of the energy taken out of the battery.
+    '''
+    price = self.prices[self.t]
+    reward = self.battery * price
+    self.battery, grid = online.settleBatch(self.battery, self.demands[self.t], self.solars[self.t], self.B_max)
+    reward -= self.battery * price
+    self.profit += grid * price
+    return reward
+
+  def observe(self):
+    t = self.t
+    return np.stack([np.full(self.numEnvs, float(t)), self.battery, self.demands[t], self.people[t], self.prices[t]], axis=1)
+
+  def step(self, action):
+    '''
+    Applies one action per environment.
+
+    Return:
+    (observation, reward, done, info). At the end of the day done is True everywhere, info holds
+    each day's total 'profit', and observation is the first of the next days (or None without
+    autoReset).
+    '''
+    reward = self.advance(action)
+    if self.t == self.numSteps:
+      info = {'profit': self.profit}
+      return self.reset() if self.autoReset else None, reward, np.ones(self.numEnvs, dtype=bool), info
+    return self.observe(), reward, np.zeros(self.numEnvs, dtype=bool), {}
+
+  def advance(self, action):
+    '''
+    step() without building the observation or resetting: applies the actions, moves to the
+    next step and returns the rewards.
+    '''
+    target = np.where(action == SELL, 0, np.where(action == FILL, self.B_max, self.battery))
+    reward = (self.battery - target) * self.prices[self.t]
+    self.profit += reward
+    self.battery = target
+    self.t += 1
+    if self.t < self.numSteps:
+      reward += self.settle()
+    return reward
+
+def countAbove(edges, values, out):
+  '''
+  Adds to out the number of edges below each value, i.e. np.searchsorted(edges, values), which
+  is faster as a few comparisons when there are only a handful of edges.
+  '''
+  for edge in edges:
+    out += values > edge
+  return out
+
+class Discretizer():
+  '''
+  Maps observations to table indices: (step, battery bin, predicted demand change bin, price bin) flattened.
+  '''
+  def __init__(self, B_max, stepsPerHour=1, batteryBins=BATTERY_BINS, changeEdges=CHANGE_EDGES, priceEdges=PRICE_EDGES):
+    self.B_max = B_max
+    self.ems = online.EnergyManagementSystem(B_max, stepsPerHour)
+    self.tariff = self.ems.tariff
+    self.batteryBins = batteryBins
+    self.changeEdges = changeEdges
+    self.priceEdges = priceEdges
+    self.shape = (self.tariff.numSteps, batteryBins, len(changeEdges) + 1, len(priceEdges) + 1)
+    self.numStates = int(np.prod(self.shape))
+
+  def __call__(self, obs):
+    return self.index(int(obs[0, 0]), obs[:, 1], obs[:, 2], obs[:, 3], obs[:, 4])
+
+  def index(self, t, battery, demand, people, price):
+    '''
+    State indices at step t (the same for every environment) from arrays of readings.
+    '''
+    numSteps, batteryBins, changeBins, priceBins = self.shape
+    state = np.minimum(battery * (batteryBins / max(self.B_max, 1e-9)), batteryBins - 1).astype(int)
+    state += t * batteryBins
+    state *= changeBins
+    predDemand = self.ems.predictDemand(t + 1, people) if t + 1 < numSteps else demand
+    countAbove(self.changeEdges, (predDemand - demand) * self.tariff.stepsPerHour, state)
+    state *= priceBins
+    countAbove(self.priceEdges, price - self.tariff.price[t], state)
+    return state
+
+class TablePolicy():
+  '''
+  A learned policy as a lookup table holding the action for every discretized state.
+  '''
+  def __init__(self, table, discretizer):
+    self.table = table
+    self.discretizer = discretizer
+
+  def act(self, obs):
+    return self.table[self.discretizer(obs)]
+
+  def evaluate(self, batch):
+    '''
+    Runs the policy over the days of a DayBatch, at the resolution it was learned at, and returns
+    each day's profit.
+    '''
+    d = self.discretizer
+    env = BatteryEnv(batch.price.shape[0], d.B_max, d.tariff.stepsPerHour, autoReset=False)
+    assert batch.price.shape[1] == env.numSteps, 'batch has {} steps per day, policy expects {}'.format(
+      batch.price.shape[1], env.numSteps)
+    env.reset(batch)
+    for t in range(env.numSteps):
+      env.advance(self.table[self.discretizer.index(t, env.battery, env.demands[t], env.people[t], env.prices[t])])
+    return env.profit
+
+  def save(self, path):
+    d = self.discretizer
+    np.savez(path, table=self.table, B_max=d.B_max, stepsPerHour=d.tariff.stepsPerHour, batteryBins=d.batteryBins,
+             changeEdges=d.changeEdges, priceEdges=d.priceEdges)
+
+  @classmethod
+  def load(cls, path):
+    with np.load(path) as data:
+      discretizer = Discretizer(float(data['B_max']), int(data['stepsPerHour']), int(data['batteryBins']),
+                                data['changeEdges'], data['priceEdges'])
+      return cls(data['table'], discretizer)
+
+class QLearner():
+  '''
+  Tabular action values over a Discretizer's states, each the running average of its updates.
+  '''
+  def __init__(self, discretizer):
+    self.discretizer = discretizer
+    self.Q = np.zeros((discretizer.numStates, len(ACTIONS)))
+    self.visits = np.zeros((discretizer.numStates, len(ACTIONS)))
+    self.numTransitions = 0
+
+  def act(self, states, epsilon=0.0, rng=np.random):
+    '''
+    Epsilon-greedy actions for an array of states.
+    '''
+    actions = self.Q[states].argmax(axis=1)
+    explore = rng.random(len(states)) < epsilon
+    actions[explore] = rng.integers(len(ACTIONS), size=explore.sum()) if hasattr(rng, 'integers') \
+                       else rng.randint(len(ACTIONS), size=explore.sum())
+    return actions
+
+  def update(self, states, actions, targets):
+    '''
+    Moves each visited Q entry to the running average of its targets.
+    '''
+    index = states * len(ACTIONS) + actions
+    sums = np.bincount(index, targets, minlength=self.Q.size).reshape(self.Q.shape)
+    counts = np.bincount(index, minlength=self.Q.size).reshape(self.Q.shape)
+    self.visits += counts
+    visited = counts > 0
+    self.Q[visited] += (sums[visited] - counts[visited] * self.Q[visited]) / self.visits[visited]
+
+  def train(self, env, numDays, epsilon=0.1, rng=np.random):
+    '''
+    Collects numDays simulated days from env with an epsilon-greedy policy, updating the table
+    backward in time after each batch of days. Days come in whole batches of env.numEnvs, so
+    numDays is rounded up to a multiple of it.
+    '''
+    obs = None
+    for first in range(0, numDays, env.numEnvs):
+      if obs is None:
+        obs = env.reset()
+      states, actions, rewards = [], [], []
+      for t in range(env.numSteps):
+        states.append(self.discretizer(obs))
+        actions.append(self.act(states[-1], epsilon, rng))
+        obs, reward, done, info = env.step(actions[-1])
+        rewards.append(reward)
+      nextValue = 0   # nothing is earned after the end of the day
+      for t in range(env.numSteps - 1, -1, -1):
+        self.update(states[t], actions[t], rewards[t] + nextValue)
+        nextValue = self.Q[states[t]].max(axis=1)
+      self.numTransitions += env.numEnvs * env.numSteps
+    return self
+
+  def policy(self):
+    '''
+    Exports the greedy policy. States never visited keep the heuristics' default of filling up.
+    '''
+    table = self.Q.argmax(axis=1).astype(np.int8)
+    table[self.visits.sum(axis=1) == 0] = FILL
+    return TablePolicy(table, self.discretizer)
+
+def main():
+  numDays = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+  B_max = 180
+  rng = np.random.default_rng(42)
+  learner = QLearner(Discretizer(B_max))
+  start = time.time()
+  learner.train(BatteryEnv(10000, B_max, rng=rng), numDays, rng=rng)
+  seconds = time.time() - start
+  print('{} transitions in {:.1f} s ({:.0f} per minute)'.format(learner.numTransitions, seconds,
+                                                              learner.numTransitions / seconds * 60))
+  policy = learner.policy()
+  policy.save('policy.npz')
+
+  test = online.generateInputBatch(online.generateWeatherBatch(100000, rng), rng)
+  EMS = online.EnergyManagementSystem(B_max)
+  optimalProfit = EMS.optimalBatch(test).mean()
+  for name, run in (('online', EMS.onlineAlgoBatch), ('online_better', EMS.onlineAlgoBetterBatch),
+                    ('learned', policy.evaluate)):
+    start = time.time()
+    profit = run(test).mean()
+    print('{}:\t average profit {}\t ratio {}\t {:.2f} s'.format(name, profit, profit / optimalProfit, time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
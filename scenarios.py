@@ -0,0 +1,166 @@
+# Persistent scenario sets: Monte Carlo days generated once, stored on disk and replayed by any
+# number of runs.
+#
+# A scenario set is a directory holding one (numDays x ...) .npy file per field -- the DayBatch
+# fields demand, people, solar and price, stored step-major as online.dayBatch lays them out, and
+# the weather from generateWeatherBatch -- plus a meta.json with the seed, chunk size, time
+# resolution and the model constants the days were drawn with. Days are generated in chunks, and
+# chunk i always draws from the i-th generator spawned off the seed, exactly like the shards in
+# montecarlo.py: a set written with the same seed and chunk size holds the same days
+# montecarlo.runMonteCarlo simulates. Readers memory-map the files and stream them a batch at a
+# time, so sets far larger than memory can be replayed.
+
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import numpy as np
+
+import online
+
+CHUNK_DAYS = 10000
+FIELDS = online.DayBatch._fields + ('weather',)
+PEOPLE_DTYPE = online.PEOPLE_DTYPE
+
+def generateChunk(args):
+  '''
+  Generates one chunk of days.
+
+  Parameters:
+  args - (numDays, seedSequence, stepsPerHour) tuple, packed so the function can be mapped over a pool
+
+  Return:
+  (weather, DayBatch) for the chunk.
+  '''
+  numDays, seed, stepsPerHour = args
+  rng = np.random.default_rng(seed)
+  weather = online.generateWeatherBatch(numDays, rng)
+  return weather, online.generateInputBatch(weather, rng, stepsPerHour)
+
+def modelConstants():
+  '''
+  Returns the numeric constants of online.py, recorded with each set so a changed model can be told apart.
+  '''
+  return dict((name, value) for name, value in sorted(vars(online).items())
+              if name.isupper() and isinstance(value, (int, float)))
+
+def writeScenarios(path, numDays, seed=42, chunkDays=CHUNK_DAYS, stepsPerHour=1, workers=1):
+  '''
+  Generates numDays days and stores them as a scenario set in the directory path, which must not
+  exist yet. The set only appears at path once it is complete.
+
+  Parameters:
+  path         - Directory to create
+  numDays      - The number of days to generate
+  seed         - Root seed; chunk i is drawn from the i-th generator spawned from it
+  chunkDays    - Days generated at a time. Changing it changes which random days are drawn.
+  stepsPerHour - Time resolution of the days
+  workers      - Number of processes generating chunks (None for one per CPU)
+
+  Return:
+  The ScenarioSet written.
+  '''
+  if online.NUM_EMPLOYEES > np.iinfo(PEOPLE_DTYPE).max:
+    raise ValueError('NUM_EMPLOYEES does not fit the stored headcount type')
+  if os.path.exists(path):
+    raise ValueError('{} already exists'.format(path))
+  counts = [chunkDays] * (numDays // chunkDays)
+  if numDays % chunkDays:
+    counts.append(numDays % chunkDays)
+  seeds = np.random.SeedSequence(seed).spawn(len(counts))
+  numSteps = online.HOURS_IN_DAY * stepsPerHour
+
+  # write to a temporary directory first so a reader never sees a half-written set
+  tmpPath = path.rstrip(os.sep) + '.tmp'
+  if os.path.exists(tmpPath):
+    shutil.rmtree(tmpPath)
+  os.makedirs(tmpPath)
+  shapes = {'weather': (numDays, 5)}
+  arrays = {}
+  for name in FIELDS:
+    dtype = PEOPLE_DTYPE if name == 'people' else float
+    arrays[name] = np.lib.format.open_memmap(os.path.join(tmpPath, name + '.npy'), mode='w+', dtype=dtype,
+                                             shape=shapes.get(name, (numDays, numSteps)),
+                                             fortran_order=name != 'weather')
+  chunks = [(count, s, stepsPerHour) for count, s in zip(counts, seeds)]
+  pool = None if workers == 1 else multiprocessing.Pool(workers)
+  try:
+    generated = map(generateChunk, chunks) if pool is None else pool.imap(generateChunk, chunks)
+    start = 0
+    for count, (weather, batch) in zip(counts, generated):
+      arrays['weather'][start:start + count] = weather
+      for name in online.DayBatch._fields:
+        arrays[name][start:start + count] = getattr(batch, name)
+      start += count
+  finally:
+    if pool is not None:
+      pool.terminate()
+  for array in arrays.values():
+    array.flush()
+  del arrays
+
+  meta = {'numDays': numDays, 'seed': seed, 'chunkDays': chunkDays, 'stepsPerHour': stepsPerHour,
+          'numpy': np.__version__, 'constants': modelConstants()}
+  with open(os.path.join(tmpPath, 'meta.json'), 'w') as f:
+    json.dump(meta, f, indent=1)
+  os.replace(tmpPath, path)
+  return ScenarioSet(path)
+
+class ScenarioSet():
+  '''
+  A stored scenario set opened for reading. The fields are read-only memory-mapped arrays, so
+  opening a set is cheap and only the days actually read are loaded.
+
+  meta         - The contents of meta.json
+  numDays      - The number of days in the set
+  stepsPerHour - Time resolution of the days
+  weather      - The (numDays x 5) weather of every day, as from generateWeatherBatch
+  '''
+  def __init__(self, path):
+    self.path = path
+    with open(os.path.join(path, 'meta.json')) as f:
+      self.meta = json.load(f)
+    self.numDays = self.meta['numDays']
+    self.stepsPerHour = self.meta['stepsPerHour']
+    self.arrays = dict((name, np.load(os.path.join(path, name + '.npy'), mmap_mode='r')) for name in FIELDS)
+    self.weather = self.arrays['weather']
+
+  def __len__(self):
+    return self.numDays
+
+  def batch(self, start=0, stop=None):
+    '''
+    Returns days start to stop (exclusive) as a DayBatch of views into the memory-mapped files.
+    As the files are step-major, each step's readings of the days are contiguous on disk.
+    '''
+    rows = slice(start, self.numDays if stop is None else stop)
+    return online.DayBatch(*[self.arrays[name][rows] for name in online.DayBatch._fields])
+
+  def batches(self, batchDays=CHUNK_DAYS, start=0, stop=None):
+    '''
+    Streams days start to stop a batch at a time.
+
+    Return:
+    A generator of (offset, DayBatch) pairs, where offset is the index of the batch's first day.
+    '''
+    stop = self.numDays if stop is None else min(stop, self.numDays)
+    for first in range(start, stop, batchDays):
+      yield first, self.batch(first, min(first + batchDays, stop))
+
+def main():
+  if len(sys.argv) < 3 or sys.argv[1] not in ('write', 'info'):
+    print('usage: scenarios.py write PATH NUM_DAYS [SEED [STEPS_PER_HOUR]]\n       scenarios.py info PATH')
+    sys.exit(1)
+  if sys.argv[1] == 'write':
+    seed = int(sys.argv[4]) if len(sys.argv) > 4 else 42
+    stepsPerHour = int(sys.argv[5]) if len(sys.argv) > 5 else 1
+    scenarioSet = writeScenarios(sys.argv[2], int(sys.argv[3]), seed, stepsPerHour=stepsPerHour, workers=None)
+  else:
+    scenarioSet = ScenarioSet(sys.argv[2])
+  print('{}: {} days, seed {}, {} steps per hour'.format(scenarioSet.path, scenarioSet.numDays,
+                                                         scenarioSet.meta['seed'], scenarioSet.stepsPerHour))
+
+
+if __name__ == '__main__':
+    main()
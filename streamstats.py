@@ -0,0 +1,197 @@
+# Constant-memory statistics for Monte Carlo runs. Values arrive in batches (one array per batch of
+# simulated days) and accumulators from different shards can be merged, so nothing needs to keep
+# every simulated day around.
+
+import math
+import numpy as np
+
+class RunningStats():
+  '''
+  Running count, mean, variance and extrema of a stream of values, plus a quantile sketch.
+
+  Quantiles come from a log-bucketed histogram: every value is counted in a bucket whose bounds are
+  within relativeAccuracy of each other, so quantile(q) is within that relative error of the true
+  quantile while memory only grows with the log of the range of the values.
+  '''
+  def __init__(self, relativeAccuracy=0.01):
+    self.count = 0
+    self.mean = 0.0
+    self.M2 = 0.0   # sum of squared differences from the mean
+    self.min = math.inf
+    self.max = -math.inf
+    self.gamma = (1 + relativeAccuracy) / (1 - relativeAccuracy)
+    self.logGamma = math.log(self.gamma)
+    self.positive = {}   # bucket index -> count
+    self.negative = {}
+    self.zeros = 0
+
+  def update(self, values):
+    values = np.asarray(values, dtype=float).ravel()
+    n = len(values)
+    if n == 0:
+      return
+    batchMean = values.mean()
+    batchM2 = ((values - batchMean) ** 2).sum()
+    self.combine(n, batchMean, batchM2)
+    self.min = min(self.min, values.min())
+    self.max = max(self.max, values.max())
+    magnitude = np.abs(values)
+    nonzero = magnitude > 1e-12
+    self.zeros += int(n - nonzero.sum())
+    index = np.ceil(np.log(magnitude[nonzero]) / self.logGamma).astype(int)
+    for buckets, sign in ((self.positive, values[nonzero] > 0), (self.negative, values[nonzero] < 0)):
+      keys, counts = np.unique(index[sign], return_counts=True)
+      for key, count in zip(keys.tolist(), counts.tolist()):
+        buckets[key] = buckets.get(key, 0) + count
+
+  def combine(self, n, mean, M2):
+    # Chan et al.'s pairwise update of the count, mean and M2
+    total = self.count + n
+    delta = mean - self.mean
+    self.mean += delta * n / total
+    self.M2 += M2 + delta ** 2 * self.count * n / total
+    self.count = total
+
+  def merge(self, other):
+    '''
+    Folds another RunningStats (built with the same relativeAccuracy) into this one.
+    '''
+    if other.count == 0:
+      return self
+    self.combine(other.count, other.mean, other.M2)
+    self.min = min(self.min, other.min)
+    self.max = max(self.max, other.max)
+    self.zeros += other.zeros
+    for buckets, others in ((self.positive, other.positive), (self.negative, other.negative)):
+      for key, count in others.items():
+        buckets[key] = buckets.get(key, 0) + count
+    return self
+
+  def variance(self):
+    return self.M2 / (self.count - 1) if self.count > 1 else 0.0
+
+  def std(self):
+    return self.variance() ** 0.5
+
+  def stderr(self):
+    return (self.variance() / self.count) ** 0.5 if self.count > 0 else math.inf
+
+  def quantile(self, q):
+    '''
+    Returns an estimate of the q-th quantile (0 <= q <= 1) of the values seen so far.
+    '''
+    if self.count == 0:
+      return math.nan
+    rank = q * (self.count - 1)
+    # walk the buckets from the most negative value to the most positive
+    ordered = [(-self.bucketValue(key), count) for key, count in sorted(self.negative.items(), reverse=True)]
+    ordered.append((0.0, self.zeros))
+    ordered += [(self.bucketValue(key), count) for key, count in sorted(self.positive.items())]
+    seen = 0
+    for value, count in ordered:
+      seen += count
+      if seen > rank:
+        return min(max(value, self.min), self.max)
+    return self.max
+
+  def bucketValue(self, key):
+    return 2 * self.gamma ** key / (self.gamma + 1)
+
+def withinPrecision(stats, precision, z=1.96):
+  '''
+  Whether the mean of every RunningStats in stats is known to within a relative precision: the
+  half-width of its confidence interval (z standard errors, 1.96 for 95%) is at most precision
+  times the magnitude of the mean. Means of exactly zero need a zero-width interval.
+  '''
+  return all(s.count > 1 and z * s.stderr() <= precision * abs(s.mean) for s in stats)
+
+class WorstK():
+  '''
+  Keeps the k days with the largest key (e.g. the worst competitive ratios) seen so far, together
+  with their data, so the worst cases can be plotted without keeping every day.
+  '''
+  def __init__(self, k):
+    self.k = k
+    self.keys = np.empty(0)
+    self.index = np.empty(0, dtype=int)
+    self.days = None
+
+  def update(self, keys, batch, offset=0):
+    '''
+    Parameters:
+    keys   - One key per day of batch
+    batch  - A DayBatch (or any tuple of per-day arrays) the keys were computed on
+    offset - Index of the first day of batch in the whole run
+    '''
+    keys = np.asarray(keys)
+    top = np.argsort(-keys, kind='stable')[:self.k]
+    self.add(keys[top], offset + top, type(batch)(*[column[top] for column in batch]))
+
+  def merge(self, other):
+    if other.days is not None:
+      self.add(other.keys, other.index, other.days)
+    return self
+
+  def add(self, keys, index, days):
+    if self.days is not None:
+      keys = np.concatenate([self.keys, keys])
+      index = np.concatenate([self.index, index])
+      days = type(days)(*[np.concatenate([old, new]) for old, new in zip(self.days, days)])
+    top = np.argsort(-keys, kind='stable')[:self.k]
+    self.keys = keys[top]
+    self.index = index[top]
+    self.days = type(days)(*[column[top] for column in days])
+
+class RunningCovariance():
+  '''
+  Running means, variances and covariance of a stream of (x, y) pairs, for control variates: with
+  E[x] known, y - beta * (x - E[x]) estimates E[y] with less variance the more x and y correlate.
+  '''
+  def __init__(self):
+    self.count = 0
+    self.meanX = 0.0
+    self.meanY = 0.0
+    self.M2x = 0.0   # sums of squared differences from the means, and of their products
+    self.M2y = 0.0
+    self.Cxy = 0.0
+
+  def update(self, x, y):
+    x = np.asarray(x, dtype=float).ravel()
+    y = np.asarray(y, dtype=float).ravel()
+    if len(x) == 0:
+      return
+    meanX, meanY = x.mean(), y.mean()
+    self.combine(len(x), meanX, meanY, ((x - meanX) ** 2).sum(), ((y - meanY) ** 2).sum(),
+                 ((x - meanX) * (y - meanY)).sum())
+
+  def combine(self, n, meanX, meanY, M2x, M2y, Cxy):
+    total = self.count + n
+    dx = meanX - self.meanX
+    dy = meanY - self.meanY
+    weight = self.count * n / total
+    self.meanX += dx * n / total
+    self.meanY += dy * n / total
+    self.M2x += M2x + dx ** 2 * weight
+    self.M2y += M2y + dy ** 2 * weight
+    self.Cxy += Cxy + dx * dy * weight
+    self.count = total
+
+  def merge(self, other):
+    if other.count > 0:
+      self.combine(other.count, other.meanX, other.meanY, other.M2x, other.M2y, other.Cxy)
+    return self
+
+  def beta(self):
+    return self.Cxy / self.M2x if self.M2x > 0 else 0.0
+
+  def controlled(self, meanX):
+    '''
+    Control-variate estimate of E[y] given E[x] = meanX.
+
+    Return:
+    (estimate, standard error).
+    '''
+    if self.count < 3:
+      return self.meanY, math.inf
+    residual = self.M2y - self.beta() * self.Cxy   # sum of squared residuals of y regressed on x
+    return self.meanY - self.beta() * (self.meanX - meanX), (max(residual, 0.0) / (self.count - 2) / self.count) ** 0.5
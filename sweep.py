@@ -0,0 +1,141 @@
+# Parameter sweeps over battery capacity and the model constants in online.py.
+#
+# Each batch of scenarios is generated once per setting of the model constants and then evaluated
+# for every (strategy, capacity) pair. All capacities go through simulateBatch together, sharing the
+# per-step predictions, so a sweep over many capacities costs little more than a single run. Every
+# setting draws its batches from the same seeds, so configurations are compared on common random
+# numbers. Given a precision, each setting stops drawing batches once its averages are that precise,
+# so noisy settings get more days than quiet ones.
+
+import contextlib
+import csv
+import itertools
+import sys
+import numpy as np
+
+import online
+import streamstats
+
+# Constants of online.py that feed generateInputBatch or the EMS predictions, and so can be swept.
+# The weather and solar constants (CLOUD_COVER_MULTPLIER, TEMP_MULTIPLIER, AVG_SOLAR_GEN, ...) are
+# not among them: generateInputBatch reports zero solar generation, as generateSolar does, so
+# sweeping them would only repeat the same results.
+SWEEPABLE = ('NUM_EMPLOYEES', 'PROB_ATTEND', 'PROB_EARLY', 'PROB_STAY_LATE', 'CONSUMPTION_PER_EMPLOYEE',
+             'EMPLOYEE_VAR', 'LOW_DEMAND_AVG', 'LOW_DEMAND_VAR', 'HIGH_DEMAND_NO_PPL_AVG', 'HIGH_DEMAND_NO_PPL_VAR',
+             'PRICE_GAUSSIAN_STD', 'TARIFF')
+
+@contextlib.contextmanager
+def modelConstants(**values):
+  '''
+  Temporarily overrides module-level constants of online.py, e.g. modelConstants(PROB_ATTEND=0.8).
+  '''
+  for name in values:
+    if not name.isupper() or not hasattr(online, name):
+      raise ValueError('{} is not a constant of online.py'.format(name))
+  saved = dict((name, getattr(online, name)) for name in values)
+  try:
+    for name, value in values.items():
+      setattr(online, name, value)
+    yield
+  finally:
+    for name, value in saved.items():
+      setattr(online, name, value)
+
+def sweep(capacities, numDays=100000, seed=42, constants=None, strategies=None, batchSize=10000, stepsPerHour=1,
+          precision=None):
+  '''
+  Evaluates every strategy at every battery capacity and every combination of model constants.
+
+  Parameters:
+  capacities   - Battery capacities (B_max, kWh) to evaluate
+  numDays      - Simulated days per setting of the constants (at most, given a precision)
+  seed         - Root seed; batch i uses the same generators under every setting
+  constants    - Dict mapping names in SWEEPABLE (CONSUMPTION_PER_EMPLOYEE, PROB_ATTEND, TARIFF, ...)
+                 to lists of values; every combination is swept
+  strategies   - Names from online.STRATEGIES to evaluate (default: all of them)
+  batchSize    - Days generated at a time
+  stepsPerHour - Time resolution of the simulated days
+  precision    - If given, each setting stops after the first batch at which every average profit
+                 and ratio is known to within this relative precision (95% confidence)
+
+  Return:
+  A tidy table as a list of dicts, one row per (constants, B_max, strategy), with the constants,
+  'B_max', 'strategy', 'days' (simulated for the setting), 'avgProfit', 'stdProfit', 'avgRatio' and 'ratioOfAverages'. Ratios
+  are taken against the optimal profit at the same capacity.
+  '''
+  strategies = list(online.STRATEGIES if strategies is None else strategies)
+  evaluated = strategies if 'optimal' in strategies else ['optimal'] + strategies
+  constants = constants or {}
+  for name in constants:
+    if name not in SWEEPABLE:
+      raise ValueError('{} does not feed the simulated days, so sweeping it has no effect; sweepable constants '
+                       'are {}'.format(name, ', '.join(SWEEPABLE)))
+  names = sorted(constants)
+  column = np.asarray(capacities, dtype=float)[:, None]
+  rows = []
+  for values in itertools.product(*[constants[name] for name in names]):
+    setting = dict(zip(names, values))
+    profits = dict(((B_max, name), streamstats.RunningStats()) for B_max in capacities for name in evaluated)
+    ratios = dict(((B_max, name), streamstats.RunningStats()) for B_max in capacities for name in evaluated)
+    with modelConstants(**setting):
+      root = np.random.SeedSequence(seed)
+      days = 0
+      while days < numDays:
+        # batch i draws from the i-th child of root; predictions don't shift the scenarios
+        scenarioSeed, predictorSeed = root.spawn(1)[0].spawn(2)
+        rng = np.random.default_rng(scenarioSeed)
+        size = min(batchSize, numDays - days)
+        batch = online.generateInputBatch(online.generateWeatherBatch(size, rng), rng, stepsPerHour)
+        # every capacity runs in the same kernel call, one row per capacity
+        EMS = online.EnergyManagementSystem(column, stepsPerHour)
+        baseline = EMS.baselineBatch(batch)
+        # without rate limits the optimal plan only ever empties or fills the battery (see
+        # optimal.py), so its gain over the baseline is linear in B_max: solve it once at 1 kWh
+        gain = online.EnergyManagementSystem(1.0, stepsPerHour).optimalBatch(batch) - baseline
+        dayProfits = {}
+        for name in evaluated:
+          if name == 'optimal':
+            dayProfits[name] = baseline + column * gain
+          elif name == 'baseline':
+            dayProfits[name] = np.broadcast_to(baseline, column.shape[:1] + baseline.shape)
+          elif name == 'random':
+            dayProfits[name] = EMS.strategyBatch(name, batch, rng=np.random.default_rng(predictorSeed))
+          else:
+            dayProfits[name] = EMS.strategyBatch(name, batch)
+        for c, B_max in enumerate(capacities):
+          for name in evaluated:
+            profits[(B_max, name)].update(dayProfits[name][c])
+            ratios[(B_max, name)].update(dayProfits[name][c] / dayProfits['optimal'][c])
+        days += size
+        if precision is not None and streamstats.withinPrecision(list(profits.values()) + list(ratios.values()),
+                                                                 precision):
+          break
+    for B_max in capacities:
+      for name in strategies:
+        row = dict(setting)
+        row.update({'B_max': B_max, 'strategy': name, 'days': days,
+                    'avgProfit': profits[(B_max, name)].mean, 'stdProfit': profits[(B_max, name)].std(),
+                    'avgRatio': ratios[(B_max, name)].mean,
+                    'ratioOfAverages': profits[(B_max, name)].mean / profits[(B_max, 'optimal')].mean})
+        rows.append(row)
+  return rows
+
+def writeCsv(rows, path):
+  '''
+  Writes a sweep result table to a CSV file.
+  '''
+  with open(path, 'w', newline='') as f:
+    writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+    writer.writeheader()
+    writer.writerows(rows)
+
+def main():
+  numDays = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+  rows = sweep(list(range(0, 501, 10)), numDays)
+  print('B_max\tstrategy\tavgProfit\tratioOfAverages')
+  for row in rows:
+    print('{}\t{}\t{:.2f}\t{:.4f}'.format(row['B_max'], row['strategy'], row['avgProfit'], row['ratioOfAverages']))
+
+
+if __name__ == '__main__':
+    main()
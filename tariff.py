@@ -0,0 +1,133 @@
+# PG&E residential time-of-use tariffs, from data/costs/ResTOUCurrent.xlsx (see data/sources.txt).
+
+import os
+import numpy as np
+
+COSTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'costs', 'ResTOUCurrent.xlsx')
+
+# E-6 time-of-use periods, from the "E-6 TOU Periods" sheet: hour ranges [start, end) per period.
+# Holidays are priced as ordinary days.
+E6_SUMMER_MONTHS = range(5, 11)   # May-October
+E6_PERIODS = {
+  ('Summer', 'weekday'): [('Peak', 13, 19), ('Part-Peak', 10, 13), ('Part-Peak', 19, 21)],
+  ('Summer', 'weekend'): [('Part-Peak', 17, 20)],
+  ('Winter', 'weekday'): [('Part-Peak', 17, 20)],
+  ('Winter', 'weekend'): [],
+}
+
+def loadRates(schedule='E-6', path=COSTS_FILE):
+  '''
+  Reads the baseline-usage energy charges of a rate schedule from the first sheet of the PG&E
+  rates workbook.
+
+  Return:
+  A dict mapping (season, period) -- e.g. ('Summer', 'Peak') -- to $/kWh.
+  '''
+  import openpyxl   # only needed when reading the workbook
+  sheet = openpyxl.load_workbook(path, read_only=True, data_only=True).worksheets[0]
+  rates = {}
+  inSchedule = False
+  season = None
+  for row in sheet.iter_rows(values_only=True):
+    name, rowSeason, period, charge = row[0], row[4], row[5], row[6]
+    if name is not None:
+      if inSchedule:
+        break
+      inSchedule = 'Rate Schedule {} '.format(schedule) in ' '.join(str(name).split()) + ' '
+    if inSchedule:
+      season = rowSeason or season
+      rates[(season, period)] = charge
+  if not rates:
+    raise ValueError('rate schedule {} not found in {}'.format(schedule, path))
+  return rates
+
+class Tariff():
+  '''
+  An immutable time-of-use tariff laid out per step of a day. Prices are precomputed into read-only
+  arrays of 24 * stepsPerHour + 1 entries, so lookups are plain (vectorizable) indexing.
+  Entry numSteps stands for the first step after the end of the day.
+
+  price     - Base price of each step; entry numSteps wraps around to the next day's first step
+  boundary  - True at the first step of each hour where the tier changes, and at midnight; the
+              synthetic prices do not move with demand on these steps. Entry numSteps is False.
+  horizonPrice - Like price, but 0 after the end of the day, where stored energy is worth nothing
+  '''
+  def __init__(self, hourlyPrices, stepsPerHour=1):
+    hourlyPrices = np.asarray(hourlyPrices, dtype=float)
+    self.stepsPerHour = stepsPerHour
+    self.numSteps = len(hourlyPrices) * stepsPerHour
+    self.hourlyPrices = hourlyPrices
+    hourly = np.append(hourlyPrices, hourlyPrices[0])
+    changes = np.append(True, hourlyPrices[1:] != hourlyPrices[:-1])
+    self.price = np.repeat(hourly, stepsPerHour)[:self.numSteps + 1]
+    self.boundary = np.zeros(self.numSteps + 1, dtype=bool)
+    self.boundary[:self.numSteps:stepsPerHour] = changes
+    self.horizonPrice = self.price.copy()
+    self.horizonPrice[self.numSteps] = 0
+    for array in (self.hourlyPrices, self.price, self.boundary, self.horizonPrice):
+      array.flags.writeable = False
+    self.resolutions = {stepsPerHour: self}
+
+  @classmethod
+  def fromPeriods(cls, rates, periods, stepsPerHour=1, default='Off-Peak'):
+    '''
+    Builds a tariff from period rates and [(period, startHour, endHour), ...] ranges; hours
+    outside every range are charged the default period's rate.
+    '''
+    hourly = np.full(24, rates[default])
+    for period, start, end in periods:
+      hourly[start:end] = rates[period]
+    return cls(hourly, stepsPerHour)
+
+  @classmethod
+  def fromWorkbook(cls, schedule='E-6', season='Summer', periods=None, stepsPerHour=1, path=COSTS_FILE):
+    '''
+    Builds a tariff from a season's energy charges in the PG&E rates workbook, laid out on the
+    given periods (by default the synthetic model's, MODEL_PERIODS).
+    '''
+    rates = dict((period, charge) for (rateSeason, period), charge in loadRates(schedule, path).items()
+                 if rateSeason == season)
+    return cls.fromPeriods(rates, MODEL_PERIODS if periods is None else periods, stepsPerHour)
+
+  def atResolution(self, stepsPerHour):
+    '''
+    Returns the same tariff laid out with stepsPerHour steps per hour. Results are cached, so this
+    is cheap to call whenever a simulator is built.
+    '''
+    if stepsPerHour not in self.resolutions:
+      other = Tariff(self.hourlyPrices, stepsPerHour)
+      other.resolutions = self.resolutions
+      self.resolutions[stepsPerHour] = other
+    return self.resolutions[stepsPerHour]
+
+# The synthetic model's tariff in online.py: E-6 summer energy charges on its own weekday periods
+MODEL_RATES = {'Peak': 0.37729, 'Part-Peak': 0.26202, 'Off-Peak': 0.18524}
+MODEL_PERIODS = [('Peak', 9, 14), ('Part-Peak', 6, 9), ('Part-Peak', 14, 16)]
+MODEL_TARIFF = Tariff.fromPeriods(MODEL_RATES, MODEL_PERIODS)
+
+def e6Schedule(date):
+  '''
+  Returns the (season, dayType) of a date, the key of its periods in E6_PERIODS.
+  '''
+  season = 'Summer' if date.month in E6_SUMMER_MONTHS else 'Winter'
+  dayType = 'weekend' if date.weekday() >= 5 else 'weekday'
+  return season, dayType
+
+def e6Tariff(date, rates, stepsPerHour=1):
+  '''
+  Returns the E-6 Tariff in effect on a date, given the energy charges from loadRates('E-6').
+  '''
+  season, dayType = e6Schedule(date)
+  seasonRates = dict((period, charge) for (rateSeason, period), charge in rates.items() if rateSeason == season)
+  return Tariff.fromPeriods(seasonRates, E6_PERIODS[(season, dayType)], stepsPerHour)
+
+def e6Prices(date, rates, stepMinutes=60):
+  '''
+  Returns the E-6 price of every step of a day as an array of 24 * 60 // stepMinutes entries.
+
+  Parameters:
+  date        - A datetime.date
+  rates       - Energy charges from loadRates('E-6')
+  stepMinutes - Length of a step in minutes; must divide an hour
+  '''
+  return e6Tariff(date, rates, 60 // stepMinutes).price[:-1]
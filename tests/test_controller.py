@@ -0,0 +1,24 @@
+# The streaming Controller, fed the steps of each day in order, must earn the batch strategy's profits.
+
+import numpy as np
+import pytest
+
+import controller
+import online
+
+@pytest.mark.parametrize('strategy', ['online', 'online_better'])
+@pytest.mark.parametrize('stepsPerHour', [1, 4])
+def test_controller_matches_batch(strategy, stepsPerHour):
+  rng = np.random.default_rng(5)
+  batch = online.generateInputBatch(online.generateWeatherBatch(50, rng), rng, stepsPerHour)
+  site = controller.Controller(180, strategy, stepsPerHour)
+  profits, traded = [], []
+  for i in range(len(batch.price)):
+    traded.append(0.0)
+    for reading in online.toDayList(batch, i):
+      traded[-1] += site.step(*reading).grid * reading[4]
+    profits.append(site.profit)
+  expected = online.EnergyManagementSystem(180, stepsPerHour).strategyBatch(strategy, batch)
+  np.testing.assert_allclose(profits, expected, rtol=1e-12)
+  # the Actions report every trade behind the profit
+  np.testing.assert_allclose(traded, profits, rtol=1e-9)
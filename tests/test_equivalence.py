@@ -0,0 +1,30 @@
+# The per-day EnergyManagementSystem strategies, the batch kernel and the dynamic-programming
+# optimum must agree on the same days.
+
+import numpy as np
+import pytest
+
+import online
+import optimal
+
+B_MAX = 180
+
+@pytest.fixture(scope='module')
+def batch():
+  rng = np.random.default_rng(7)
+  return online.generateInputBatch(online.generateWeatherBatch(300, rng), rng)
+
+@pytest.mark.parametrize('name', ['offlineAlgo', 'onlineAlgo', 'onlineAlgoBetter', 'baseline'])
+def test_per_day_matches_batch(batch, name):
+  EMS = online.EnergyManagementSystem(B_MAX)
+  perDay = [getattr(EMS, name)(online.toDayList(batch, i)) for i in range(len(batch.price))]
+  np.testing.assert_array_equal(perDay, getattr(EMS, name + 'Batch')(batch))
+
+def test_optimum_is_unconstrained_offline(batch):
+  EMS = online.EnergyManagementSystem(B_MAX)
+  np.testing.assert_allclose(EMS.optimalBatch(batch), EMS.offlineAlgoBatch(batch), rtol=1e-12)
+
+def test_optimum_on_finer_grid_is_unconstrained_offline(batch):
+  # rate limits of a whole battery bind nothing, but make the dynamic program run on every level
+  profit = optimal.solveOptimal(batch, B_MAX, B_MAX, B_MAX, stepSize=10.0)
+  np.testing.assert_allclose(profit, online.EnergyManagementSystem(B_MAX).offlineAlgoBatch(batch), rtol=1e-12)
@@ -0,0 +1,23 @@
+# A Fleet must earn every site what the site's own EnergyManagementSystem earns on its readings.
+
+import numpy as np
+import pytest
+
+import fleet
+import online
+
+@pytest.mark.parametrize('strategy', ['online', 'online_better'])
+def test_fleet_matches_each_site(strategy):
+  rng = np.random.default_rng(3)
+  numSites = 40
+  B_max = rng.uniform(0, 360, numSites)
+  numEmployees = rng.integers(20, 200, numSites)
+  sites = fleet.Fleet(numSites, B_max, numEmployees, strategy)
+  batch = sites.newDay(rng)
+  profit = sites.runDay(batch)
+  for i in range(numSites):
+    EMS = online.EnergyManagementSystem(B_max[i], numEmployees=numEmployees[i])
+    day = online.toDayList(batch, i)
+    expected = EMS.onlineAlgo(day) if strategy == 'online' else EMS.onlineAlgoBetter(day)
+    assert profit[i] == pytest.approx(expected, rel=1e-12)
+  np.testing.assert_array_equal(sites.totalProfit, profit)
@@ -0,0 +1,33 @@
+# Warm-started incremental dispatch must find the same optimum as solving every timestep from scratch.
+
+import numpy as np
+import pytest
+
+import gridflow
+
+pytest.importorskip('highspy')
+
+def test_incremental_matches_cold_solve():
+  rng = np.random.default_rng(4)
+  G = gridflow.simpleGrid()
+  for u, v, data in G.edges(data=True):
+    data['capacity'] = 60.0
+  model = gridflow.GridModel.fromGraph(G, genCost=rng.uniform(0, 5, len(G)))
+  numSteps = 48
+  generators = [model.index[node] for node in (gridflow.W, gridflow.S, gridflow.B, gridflow.P)]
+  consumer = model.index[gridflow.D]
+  supply = np.zeros((numSteps, len(model.nodes)))
+  demand = np.zeros((numSteps, len(model.nodes)))
+  # demand wanders; generating capacity is edited a unit at a time, sometimes to nothing
+  demand[:, consumer] = np.maximum(0, 80 + np.cumsum(rng.normal(0, 10, numSteps)))
+  supply[0, generators] = rng.uniform(0, 60, len(generators))
+  for t in range(1, numSteps):
+    supply[t] = supply[t - 1]
+    unit = rng.choice(generators)
+    supply[t, unit] = 0 if rng.random() < 0.2 else rng.uniform(0, 60)
+
+  cold = model.solve(supply, demand)
+  warm = model.solveIncremental(supply, demand)
+  np.testing.assert_allclose(warm.cost, cold.cost, rtol=4e-8)
+  np.testing.assert_allclose(warm.unmet.sum(axis=1), cold.unmet.sum(axis=1), atol=1e-6)
+  assert (cold.unmet.sum(axis=1) > 0).any() and (cold.unmet.sum(axis=1) == 0).any()
@@ -0,0 +1,40 @@
+# MPC must earn at least online_better and at most the offline optimum, and its memo of tail
+# values must not change what it earns.
+
+import numpy as np
+import pytest
+
+import mpc
+import online
+import optimal
+
+B_MAX, RATE, STEP_SIZE = 180, 30, 10.0
+
+@pytest.fixture(scope='module')
+def batch():
+  rng = np.random.default_rng(8)
+  return online.generateInputBatch(online.generateWeatherBatch(200, rng), rng)
+
+def test_between_online_better_and_optimal(batch):
+  EMS = online.EnergyManagementSystem(B_MAX)
+  profit = mpc.MPCPolicy(EMS).run(batch)
+  assert (profit >= EMS.onlineAlgoBetterBatch(batch) - 1e-9).all()
+  assert (profit <= EMS.optimalBatch(batch) + 1e-9).all()
+  # with rate limits, still no better than the limited optimum
+  limited = mpc.MPCPolicy(EMS, RATE, RATE, STEP_SIZE).run(batch)
+  assert (limited <= optimal.solveOptimal(batch, B_MAX, RATE, RATE, STEP_SIZE) + 1e-9).all()
+
+def test_memo_matches_uncached(batch):
+  EMS = online.EnergyManagementSystem(B_MAX)
+  policy = mpc.MPCPolicy(EMS, RATE, RATE, STEP_SIZE)
+  # the second half reuses tails the first half solved
+  half = len(batch.price) // 2
+  cached = np.concatenate([policy.run(online.dayBatch(*[column[rows] for column in batch]))
+                           for rows in (slice(0, half), slice(half, None))])
+  assert policy.hits > 0
+  # a fresh policy per day never finds a (t, people) tail it has already solved
+  for i in range(0, len(batch.price), 20):
+    fresh = mpc.MPCPolicy(EMS, RATE, RATE, STEP_SIZE)
+    day = online.dayBatch(*[column[i:i + 1] for column in batch])
+    assert fresh.run(day)[0] == pytest.approx(cached[i], rel=1e-12)
+    assert fresh.hits == 0
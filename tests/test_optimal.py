@@ -0,0 +1,36 @@
+# solveOptimal must find the best battery plan a brute-force search over every plan finds.
+
+import itertools
+import numpy as np
+import pytest
+
+import online
+import optimal
+
+def bruteForce(demand, solar, price, B_max, maxCharge, maxDischarge, stepSize):
+  '''
+  Best profit of one day over every sequence of battery levels on the stepSize grid within the rate limits.
+  '''
+  levels = np.arange(0, B_max + stepSize / 2, stepSize)
+  plans = np.array(list(itertools.product(levels, repeat=len(price))))
+  moves = np.diff(plans, axis=1, prepend=0)
+  feasible = (moves <= maxCharge + 1e-9).all(axis=1) & (-moves <= maxDischarge + 1e-9).all(axis=1)
+  return (price * (solar - demand - moves[feasible])).sum(axis=1).max()
+
+@pytest.mark.parametrize('maxCharge, maxDischarge', [(20, 10), (10, 30), (40, 40)])
+def test_matches_brute_force(maxCharge, maxDischarge):
+  rng = np.random.default_rng(11)
+  numDays, numSteps, B_max, stepSize = 4, 6, 40, 10
+  batch = online.dayBatch(rng.uniform(0, 30, (numDays, numSteps)), np.zeros((numDays, numSteps), dtype=int),
+                          rng.uniform(0, 10, (numDays, numSteps)), rng.uniform(0.05, 0.5, (numDays, numSteps)))
+  profit, plan = optimal.solveOptimal(batch, B_max, maxCharge, maxDischarge, stepSize, returnPlan=True)
+  for i in range(numDays):
+    expected = bruteForce(batch.demand[i], batch.solar[i], batch.price[i], B_max, maxCharge, maxDischarge, stepSize)
+    assert profit[i] == pytest.approx(expected, rel=1e-12)
+    # the returned plan is feasible and earns the optimal profit
+    moves = np.diff(np.concatenate([[0], plan[i]]))
+    assert moves.max() <= maxCharge and -moves.min() <= maxDischarge
+    assert np.sum(batch.price[i] * (batch.solar[i] - batch.demand[i] - moves)) == pytest.approx(expected, rel=1e-12)
+  if maxCharge < B_max:
+    # the limits bind: the unconstrained optimum earns more
+    assert (optimal.solveOptimal(batch, B_max) > profit + 1e-9).any()
@@ -0,0 +1,24 @@
+# The time resolution of the simulated days should not change their economics: 5-minute days
+# average out to about what hourly days do, for every strategy.
+
+import numpy as np
+
+import online
+
+def meanProfits(stepsPerHour, numDays=2000, seed=3):
+  rng = np.random.default_rng(seed)
+  batch = online.generateInputBatch(online.generateWeatherBatch(numDays, rng), rng, stepsPerHour)
+  EMS = online.EnergyManagementSystem(180, stepsPerHour)
+  return dict((name, profits.mean()) for name, profits in EMS.compareBatch(batch, rng).items())
+
+def test_five_minute_days_match_hourly_means():
+  hourly = meanProfits(1)
+  fiveMinute = meanProfits(12)
+  for name in online.STRATEGIES:
+    assert abs(fiveMinute[name] - hourly[name]) < 0.1 * abs(hourly[name]), name
+
+def test_online_better_matches_hourly():
+  # online_better predicts the hourly price process the days are generated with at any resolution
+  hourly = meanProfits(1, 4000)['online_better']
+  fiveMinute = meanProfits(12, 4000)['online_better']
+  assert abs(fiveMinute - hourly) < 0.02 * abs(hourly)
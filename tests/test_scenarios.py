@@ -0,0 +1,37 @@
+# A stored scenario set must hold exactly the days montecarlo.py would generate from the same seeds.
+
+import numpy as np
+import pytest
+
+import montecarlo
+import online
+import scenarios
+
+NUM_DAYS, CHUNK_DAYS, SEED = 250, 100, 9
+
+@pytest.fixture(scope='module')
+def scenarioSet(tmp_path_factory):
+  return scenarios.writeScenarios(str(tmp_path_factory.mktemp('sets') / 'days'), NUM_DAYS, SEED, CHUNK_DAYS,
+                                  workers=2)
+
+def test_round_trip(scenarioSet):
+  reopened = scenarios.ScenarioSet(scenarioSet.path)
+  assert len(reopened) == NUM_DAYS and reopened.meta['seed'] == SEED
+  seeds = np.random.SeedSequence(SEED).spawn(3)
+  for (first, batch), seed in zip(reopened.batches(CHUNK_DAYS), seeds):
+    rng = np.random.default_rng(seed)
+    weather = online.generateWeatherBatch(len(batch.price), rng)
+    expected = online.generateInputBatch(weather, rng)
+    np.testing.assert_array_equal(reopened.weather[first:first + len(batch.price)], weather)
+    for name in online.DayBatch._fields:
+      np.testing.assert_array_equal(getattr(batch, name), getattr(expected, name))
+
+def test_monte_carlo_from_scenarios(scenarioSet):
+  generated = montecarlo.runMonteCarlo(NUM_DAYS, SEED, workers=1, shardSize=CHUNK_DAYS)
+  stored = montecarlo.runMonteCarlo(NUM_DAYS, SEED, workers=1, shardSize=CHUNK_DAYS, scenarioPath=scenarioSet.path)
+  # the random strategy draws from the shard's generator after its days in one run, before in the other
+  for name in online.STRATEGIES:
+    if name != 'random':
+      assert stored[0][name].mean == generated[0][name].mean
+      assert stored[1][name].mean == generated[1][name].mean
+  np.testing.assert_array_equal(stored[2].index, generated[2].index)
@@ -0,0 +1,55 @@
+# Streaming accumulators must agree with numpy on the whole data, however it is split into shards.
+
+import numpy as np
+import pytest
+
+import online
+import streamstats
+
+@pytest.mark.parametrize('seed', range(5))
+def test_merged_shards_match_numpy(seed):
+  rng = np.random.default_rng(seed)
+  values = rng.normal(-700, 50, 20000) * rng.lognormal(0, 1, 20000)
+  cuts = np.sort(rng.choice(np.arange(1, len(values)), size=rng.integers(1, 30), replace=False))
+  total = streamstats.RunningStats()
+  for shard in np.split(values, cuts):
+    stats = streamstats.RunningStats()
+    # each shard itself arrives in a few batches
+    for part in np.array_split(shard, rng.integers(1, 4)):
+      stats.update(part)
+    total.merge(stats)
+  assert total.count == len(values)
+  assert total.mean == pytest.approx(values.mean(), rel=1e-12)
+  assert total.variance() == pytest.approx(values.var(ddof=1), rel=1e-12)
+  assert (total.min, total.max) == (values.min(), values.max())
+
+@pytest.mark.parametrize('relativeAccuracy', [0.01, 0.05])
+def test_quantiles_within_relative_accuracy(relativeAccuracy):
+  rng = np.random.default_rng(1)
+  values = np.concatenate([-rng.lognormal(3, 2, 5000), rng.lognormal(0, 3, 5000), np.zeros(100)])
+  stats = streamstats.RunningStats(relativeAccuracy)
+  for part in np.array_split(rng.permutation(values), 7):
+    stats.update(part)
+  for q in np.linspace(0, 1, 101):
+    true = np.quantile(values, q, method='lower')
+    assert abs(stats.quantile(q) - true) <= relativeAccuracy * abs(true) + 1e-12
+
+def test_worst_k_matches_argsort():
+  rng = np.random.default_rng(2)
+  numDays, k = 5000, 10
+  keys = rng.normal(size=numDays)
+  days = online.DayBatch(*[rng.normal(size=(numDays, 24)) for field in online.DayBatch._fields])
+  shards = []
+  for first in range(0, numDays, 700):
+    rows = slice(first, first + 700)
+    shard = streamstats.WorstK(k)
+    shard.update(keys[rows], online.DayBatch(*[column[rows] for column in days]), first)
+    shards.append(shard)
+  worst = streamstats.WorstK(k)
+  for shard in shards[::-1]:
+    worst.merge(shard)
+  expected = np.argsort(-keys)[:k]
+  np.testing.assert_array_equal(worst.index, expected)
+  np.testing.assert_array_equal(worst.keys, keys[expected])
+  for column, merged in zip(days, worst.days):
+    np.testing.assert_array_equal(merged, column[expected])
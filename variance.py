@@ -0,0 +1,198 @@
+# Variance reduction for comparing the EMS strategies.
+#
+# online.main() estimates every strategy's average profit on its own, which takes ~100k days to
+# settle. Three things here get the same confidence intervals from far fewer days:
+# - Common random numbers: every strategy already runs on the same days (compareBatch), so the
+#   difference between two strategies is estimated from paired per-day differences, whose variance
+#   is much smaller than that of either profit.
+# - Antithetic pairs: AntitheticGenerator stands in for the random generator of the batch
+#   generators and mirrors every draw of the first half of a batch into the second half (u and
+#   1 - u, z and -z), so the two days of a pair err in opposite directions. Pairs, not days, are
+#   then the independent samples.
+# - Control variates: the baseline profit (buying all demand from the grid) is closed-form given a
+#   day and correlates with every strategy's profit, so with its mean known the profits are
+#   regressed on it and the part it explains is removed.
+
+import sys
+import time
+import numpy as np
+import scipy.stats
+
+import online
+import streamstats
+from online import STRATEGIES
+
+Z_95 = 1.96   # normal quantile of two-sided 95% intervals
+
+class AntitheticGenerator():
+  '''
+  Wraps a random generator (np.random or a np.random.Generator) for generateWeatherBatch and
+  generateInputBatch. Draws whose first axis has one entry per day of a batch of numDays (even)
+  days come in antithetic pairs: day i + numDays / 2 gets the mirror image of day i's draw, from
+  the inverse CDF of 1 - u where day i used u. Other draws (such as the triangular cloud cover of
+  the partly cloudy days only) are passed through unpaired.
+  '''
+  def __init__(self, rng, numDays):
+    if numDays % 2:
+      raise ValueError('antithetic batches need an even number of days, not {}'.format(numDays))
+    self.rng = rng
+    self.numDays = numDays
+
+  def shape(self, size, *params):
+    if size is None:
+      return np.broadcast(*params).shape if params else ()
+    return tuple(np.atleast_1d(size).tolist())
+
+  def paired(self, shape):
+    return len(shape) > 0 and shape[0] == self.numDays
+
+  def uniform(self, shape):
+    if not self.paired(shape):
+      return self.rng.random(shape)
+    u = self.rng.random((self.numDays // 2,) + shape[1:])
+    return np.concatenate([u, 1 - u])
+
+  def random(self, size=None):
+    return self.uniform(self.shape(size))
+
+  def normal(self, loc=0.0, scale=1.0, size=None):
+    shape = self.shape(size, loc, scale)
+    if not self.paired(shape):
+      return self.rng.normal(loc, scale, size)
+    z = self.rng.standard_normal((self.numDays // 2,) + shape[1:])
+    return loc + scale * np.concatenate([z, -z])
+
+  def binomial(self, n, p, size=None):
+    shape = self.shape(size, n, p)
+    if not self.paired(shape):
+      return self.rng.binomial(n, p, size)
+    return binomialQuantile(self.uniform(shape), n, p)
+
+  def triangular(self, left, mode, right, size=None):
+    shape = self.shape(size, left, mode, right)
+    if not self.paired(shape):
+      return self.rng.triangular(left, mode, right, size)
+    u = self.uniform(shape)
+    split = (mode - left) / (right - left)
+    return np.where(u < split, left + np.sqrt(u * (right - left) * (mode - left)),
+                    right - np.sqrt((1 - u) * (right - left) * (right - mode)))
+
+def binomialQuantile(u, n, p):
+  '''
+  scipy.stats.binom.ppf(u, n, p) as ints, faster for the few distinct (n, p) pairs of the input
+  generator: one CDF table row per pair, and a single searchsorted over the rows laid end to end
+  (row i shifted up by 2i, so rows do not overlap).
+  '''
+  n, p, u = np.broadcast_arrays(n, p, u)
+  keys, row = np.unique(np.stack([n.ravel(), p.ravel()], axis=1), axis=0, return_inverse=True)
+  row = row.ravel()
+  cdf = scipy.stats.binom.cdf(np.arange(n.max() + 1), keys[:, :1], keys[:, 1:])
+  k = np.searchsorted((cdf + 2 * np.arange(len(keys))[:, None]).ravel(), u.ravel() + 2 * row) - row * cdf.shape[1]
+  return np.minimum(k, n.ravel()).reshape(u.shape)
+
+def generateDays(numDays, rng=np.random, stepsPerHour=1, antithetic=False):
+  '''
+  Generates a DayBatch of numDays days; with antithetic, day i + numDays / 2 mirrors day i.
+  '''
+  if antithetic:
+    rng = AntitheticGenerator(rng, numDays)
+  return online.generateInputBatch(online.generateWeatherBatch(numDays, rng), rng, stepsPerHour)
+
+def samples(values, antithetic):
+  '''
+  The independent samples in a batch of per-day values: the days, or the means of antithetic pairs.
+  '''
+  if not antithetic:
+    return values
+  half = len(values) // 2
+  return (values[:half] + values[half:]) / 2
+
+def estimateBaseline(numDays, seed=0, stepsPerHour=1, batchSize=10000):
+  '''
+  Estimates the mean baseline profit from numDays antithetic days, on which the baseline (linear in
+  the demand noise) has very little variance. Use a seed other than the comparison's.
+
+  Return:
+  (mean, standard error), as RunningCovariance.controlled takes.
+  '''
+  rng = np.random.default_rng(seed)
+  EMS = online.EnergyManagementSystem(0, stepsPerHour)
+  stats = streamstats.RunningStats()
+  for start in range(0, numDays, batchSize):
+    batch = generateDays(min(batchSize, numDays - start), rng, stepsPerHour, antithetic=True)
+    stats.update(samples(EMS.baselineBatch(batch), True))
+  return stats.mean, stats.stderr()
+
+def compareStrategies(numDays, B_max=180, seed=42, batchSize=10000, stepsPerHour=1, antithetic=False,
+                      reference='optimal'):
+  '''
+  Runs every strategy on the same numDays days and accumulates what each variance reduction needs.
+
+  Parameters:
+  numDays      - Simulated days (rounded up to whole batches)
+  B_max        - Battery capacity in kWh
+  seed         - Seed of the days and of the random strategy
+  batchSize    - Days generated at a time; even when antithetic
+  stepsPerHour - Time resolution of the simulated days
+  antithetic   - Generate the days in antithetic pairs
+  reference    - Strategy the paired differences are taken against
+
+  Return:
+  A dict mapping each strategy to a dict of 'profit' (RunningStats of its profits), 'difference'
+  (RunningStats of its profit minus the reference's) and 'baseline' (RunningCovariance of the
+  baseline profit and its profit), all over independent samples: days, or antithetic pairs.
+  '''
+  rng = np.random.default_rng(seed)
+  EMS = online.EnergyManagementSystem(B_max, stepsPerHour)
+  results = dict((name, {'profit': streamstats.RunningStats(), 'difference': streamstats.RunningStats(),
+                         'baseline': streamstats.RunningCovariance()}) for name in STRATEGIES)
+  for start in range(0, numDays, batchSize):
+    dayProfits = EMS.compareBatch(generateDays(batchSize, rng, stepsPerHour, antithetic), rng)
+    profits = dict((name, samples(dayProfits[name], antithetic)) for name in STRATEGIES)
+    for name in STRATEGIES:
+      results[name]['profit'].update(profits[name])
+      results[name]['difference'].update(profits[name] - profits[reference])
+      results[name]['baseline'].update(profits['baseline'], profits[name])
+  return results
+
+def summarize(results, baseline=None):
+  '''
+  Turns compareStrategies results into 95% confidence intervals.
+
+  Parameters:
+  baseline - (mean, standard error) of the baseline profit, e.g. from estimateBaseline, for the
+             control-variate estimates; None leaves them out
+
+  Return:
+  A dict mapping each strategy to 'profit' (mean, half-width) estimated on its own, 'difference'
+  (mean, half-width) against the reference, and, given the baseline, 'controlled' (mean, half-width).
+  '''
+  summary = {}
+  for name, stats in results.items():
+    row = {'profit': (stats['profit'].mean, Z_95 * stats['profit'].stderr()),
+           'difference': (stats['difference'].mean, Z_95 * stats['difference'].stderr())}
+    if baseline is not None:
+      cov = stats['baseline']
+      mean, stderr = cov.controlled(baseline[0])
+      # the error in the baseline's mean carries over, scaled by beta
+      row['controlled'] = (mean, Z_95 * (stderr ** 2 + (cov.beta() * baseline[1]) ** 2) ** 0.5)
+    summary[name] = row
+  return summary
+
+def main():
+  numDays = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+  baseline = estimateBaseline(numDays)
+  for antithetic in (False, True):
+    start = time.time()
+    summary = summarize(compareStrategies(numDays, antithetic=antithetic), baseline)
+    print('{} days{} in {:.1f} s (95% half-widths)'.format(numDays, ', antithetic pairs' if antithetic else '',
+                                                          time.time() - start))
+    for name in STRATEGIES:
+      row = summary[name]
+      print('{:14s} profit {:9.2f} +- {:6.3f}   vs optimal {:8.2f} +- {:6.3f}   controlled {:9.2f} +- {:6.3f}'.format(
+        name, row['profit'][0], row['profit'][1], row['difference'][0], row['difference'][1], row['controlled'][0],
+        row['controlled'][1]))
+
+
+if __name__ == '__main__':
+    main()